@@ -8,24 +8,89 @@ https://github.com/codetheweb/tuyapi/issues/31.
 """
 import logging
 
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_HOST
-from homeassistant.core import HomeAssistant, callback
+import voluptuous as vol
+
+from homeassistant.config_entries import SOURCE_IMPORT, ConfigEntry
+from homeassistant.const import CONF_HOST, CONF_NAME
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity_registry import async_migrate_entries
+from homeassistant.helpers.event import async_track_time_interval
 
 from .const import (
+    CONFIG_WATCH_INTERVAL,
+    CONF_CONFIG_DIR,
+    CONF_DEVICES,
     CONF_DEVICE_ID,
     CONF_LIGHT,
     CONF_LOCAL_KEY,
     CONF_LOCK,
     CONF_TYPE,
     DOMAIN,
+    EVENT_HISTORY,
+    FAST_REFRESH_INTERVAL,
+    SCAN_INTERVAL,
+    SERVICE_DUMP_HISTORY,
+    SERVICE_RELOAD_CONFIGS,
 )
 from .device import setup_device, delete_device
-from .helpers.device_config import get_config
+from .helpers.device_config import get_config, reload_configs, set_user_config_dir
+from .helpers.entity_factory import create_entities
+from .helpers.history import DpsHistory
+from .helpers.snapshot_store import async_get_snapshot_store
 
 _LOGGER = logging.getLogger(__name__)
 
+# hass.data key for the timer watching the device config files
+_CONFIG_WATCH = f"{DOMAIN}_config_watch"
+
+# Devices to import, such as the entries written by the bulk scanner.  Any
+# other keys are the entities to enable.
+DEVICE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_NAME): cv.string,
+        vol.Required(CONF_DEVICE_ID): cv.string,
+        vol.Required(CONF_HOST): cv.string,
+        vol.Required(CONF_LOCAL_KEY): cv.string,
+        vol.Required(CONF_TYPE): cv.string,
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+CONFIG_SCHEMA = vol.Schema(
+    {
+        DOMAIN: vol.Schema(
+            {
+                vol.Optional(CONF_CONFIG_DIR): cv.string,
+                vol.Optional(CONF_DEVICES): vol.All(cv.ensure_list, [DEVICE_SCHEMA]),
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+async def async_setup(hass: HomeAssistant, config: dict):
+    """
+    Set up the directory for user supplied device configs, which defaults
+    to tuya_local/ in the Home Assistant config directory, and import any
+    devices listed in configuration.yaml that are not set up yet.
+    """
+    conf = config.get(DOMAIN, {})
+    user_dir = conf.get(CONF_CONFIG_DIR, hass.config.path(DOMAIN))
+    _LOGGER.debug("Using user device configs from %s", user_dir)
+    set_user_config_dir(user_dir)
+    await hass.async_add_executor_job(reload_configs)
+
+    for device in conf.get(CONF_DEVICES, []):
+        hass.async_create_task(
+            hass.config_entries.flow.async_init(
+                DOMAIN, context={"source": SOURCE_IMPORT}, data=device
+            )
+        )
+    return True
+
 
 async def async_migrate_entry(hass, entry: ConfigEntry):
     """Migrate to latest config format."""
@@ -190,27 +255,153 @@ async def async_migrate_entry(hass, entry: ConfigEntry):
     return True
 
 
+@callback
+def _async_track_poll(hass, device):
+    """
+    Poll the full device status, once for all of the device's entities.
+    The entities do not poll themselves, but write their state when the
+    device reports a change to their dps.
+    """
+
+    async def async_poll(now):
+        await device.async_refresh()
+
+    return async_track_time_interval(hass, async_poll, SCAN_INTERVAL)
+
+
+def _async_track_fast_refresh(hass, device, device_conf, config, data):
+    """
+    Refresh the fast_refresh dps of enabled entities on a faster cadence
+    than the full device status.
+    """
+    remove = data.pop("remove_fast_refresh", None)
+    if remove is not None:
+        remove()
+
+    dps_ids = sorted(
+        {
+            d.id
+            for e in device_conf.all_entities()
+            if config.get(e.config_id, False)
+            for d in e.dps()
+            if d.fast_refresh
+        }
+    )
+    if not dps_ids:
+        return
+
+    async def async_refresh_fast_dps(now):
+        await device.async_refresh_dps(dps_ids)
+
+    _LOGGER.debug("Fast refreshing dps %s for %s", dps_ids, config[CONF_DEVICE_ID])
+    data["remove_fast_refresh"] = async_track_time_interval(
+        hass, async_refresh_fast_dps, FAST_REFRESH_INTERVAL
+    )
+
+
+async def _async_dump_history(hass: HomeAssistant, call: ServiceCall):
+    """Fire an event containing the recorded dps history of a device."""
+    device_id = call.data[CONF_DEVICE_ID]
+    data = hass.data.get(DOMAIN, {}).get(device_id)
+    if data is None or "history" not in data:
+        raise HomeAssistantError(f"No Tuya Local device with id {device_id}")
+    hass.bus.async_fire(
+        EVENT_HISTORY,
+        {
+            CONF_DEVICE_ID: device_id,
+            "history": data["history"].as_dicts(call.data.get("dps")),
+        },
+    )
+
+
+async def async_reload_configs(hass: HomeAssistant):
+    """
+    Reload device config files that changed on disk, and rebuild the
+    entities of devices using them, keeping the devices connected.
+    """
+    changed = await hass.async_add_executor_job(reload_configs)
+    if not changed:
+        return
+    loaded = hass.data.get(DOMAIN, {})
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        device_id = entry.data[CONF_DEVICE_ID]
+        if entry.data.get(CONF_TYPE) in changed and device_id in loaded:
+            _LOGGER.info("Rebuilding entities for %s", entry.title)
+            await async_update_entry(hass, entry)
+
+
+@callback
+def _async_watch_configs(hass: HomeAssistant):
+    if _CONFIG_WATCH in hass.data:
+        return
+
+    async def async_check_configs(now):
+        await async_reload_configs(hass)
+
+    hass.data[_CONFIG_WATCH] = async_track_time_interval(
+        hass, async_check_configs, CONFIG_WATCH_INTERVAL
+    )
+
+
+@callback
+def _async_register_services(hass: HomeAssistant):
+    if hass.services.has_service(DOMAIN, SERVICE_DUMP_HISTORY):
+        return
+
+    async def async_dump_history(call):
+        await _async_dump_history(hass, call)
+
+    async def async_reload_configs_service(call):
+        await async_reload_configs(hass)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_RELOAD_CONFIGS, async_reload_configs_service
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_DUMP_HISTORY,
+        async_dump_history,
+        schema=vol.Schema(
+            {
+                vol.Required(CONF_DEVICE_ID): str,
+                vol.Optional("dps"): vol.Coerce(str),
+            }
+        ),
+    )
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     _LOGGER.debug(f"Setting up entry for device: {entry.data[CONF_DEVICE_ID]}")
     config = {**entry.data, **entry.options, "name": entry.title}
-    setup_device(hass, config)
+    device = setup_device(hass, config)
+    store = await async_get_snapshot_store(hass)
+    data = hass.data.setdefault(DOMAIN, {}).setdefault(config[CONF_DEVICE_ID], {})
+    data["remove_snapshot_listener"] = store.async_track(device)
+    data["history"] = DpsHistory()
+    data["remove_history_listener"] = device.add_listener(
+        data["history"].record, pending=False
+    )
+    data["connection"] = (config[CONF_HOST], config[CONF_LOCAL_KEY])
     device_conf = get_config(entry.data[CONF_TYPE])
     if device_conf is None:
         _LOGGER.error(f"Configuration file for {config[CONF_TYPE]} not found.")
         return False
+    data["device_conf"] = device_conf
 
-    entities = {}
-    e = device_conf.primary_entity
-    if config.get(e.config_id, False):
-        entities[e.entity] = True
-    for e in device_conf.secondary_entities():
-        if config.get(e.config_id, False):
-            entities[e.entity] = True
+    # Build the entities for all platforms in one pass over the config, for
+    # the platforms to pick up as they are set up.
+    entities = create_entities(device, device_conf, config)
+    data["entities"] = entities
+    data["remove_poll"] = _async_track_poll(hass, device)
+    _async_track_fast_refresh(hass, device, device_conf, config, data)
 
     for e in entities:
         hass.async_create_task(hass.config_entries.async_forward_entry_setup(entry, e))
 
-    entry.add_update_listener(async_update_entry)
+    data["remove_update_listener"] = entry.add_update_listener(async_update_entry)
+    _async_register_services(hass)
+    _async_watch_configs(hass)
 
     return True
 
@@ -219,29 +410,79 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     _LOGGER.debug(f"Unloading entry for device: {entry.data[CONF_DEVICE_ID]}")
     config = entry.data
     data = hass.data[DOMAIN][config[CONF_DEVICE_ID]]
-    device_conf = get_config(config[CONF_TYPE])
+    # Unload the entities as they were built, even if the config has changed
+    device_conf = data.get("device_conf") or get_config(config[CONF_TYPE])
     if device_conf is None:
         _LOGGER.error(f"Configuration file for {config[CONF_TYPE]} not found.")
         return False
 
     entities = {}
-    e = device_conf.primary_entity
-    if e.config_id in data:
-        entities[e.entity] = True
-    for e in device_conf.secondary_entities():
+    for e in device_conf.all_entities():
         if e.config_id in data:
             entities[e.entity] = True
 
     for e in entities:
         await hass.config_entries.async_forward_entry_unload(entry, e)
 
+    data["remove_snapshot_listener"]()
+    data["remove_update_listener"]()
+    data["remove_history_listener"]()
+    data["remove_poll"]()
+    if "remove_fast_refresh" in data:
+        data["remove_fast_refresh"]()
     delete_device(hass, config)
     del hass.data[DOMAIN][config[CONF_DEVICE_ID]]
+    if not hass.data[DOMAIN] and _CONFIG_WATCH in hass.data:
+        hass.data.pop(_CONFIG_WATCH)()
 
     return True
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    _LOGGER.debug("Removing snapshot for device: %s", entry.data[CONF_DEVICE_ID])
+    store = await async_get_snapshot_store(hass)
+    store.async_remove(entry.data[CONF_DEVICE_ID])
+
+
 async def async_update_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """
+    Apply changed options or device config.  When the connection details
+    are unchanged, the device and its cached state are kept, and only
+    platforms whose entities were enabled or disabled are reloaded, or all
+    of them if the device config was reloaded.
+    """
     _LOGGER.debug(f"Updating entry for device: {entry.data[CONF_DEVICE_ID]}")
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
+    config = {**entry.data, **entry.options, "name": entry.title}
+    data = hass.data[DOMAIN][config[CONF_DEVICE_ID]]
+    device_conf = get_config(config[CONF_TYPE])
+    if device_conf is None or data.get("connection") != (
+        config[CONF_HOST],
+        config[CONF_LOCAL_KEY],
+    ):
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    loaded_conf = data.get("device_conf", device_conf)
+    loaded = {}
+    for e in loaded_conf.all_entities():
+        if e.config_id in data:
+            loaded.setdefault(e.entity, set()).add(e.config_id)
+    wanted = {}
+    for e in device_conf.all_entities():
+        if config.get(e.config_id, False):
+            wanted.setdefault(e.entity, set()).add(e.config_id)
+
+    data["device_conf"] = device_conf
+    for platform in loaded.keys() | wanted.keys():
+        if loaded_conf is device_conf and loaded.get(platform) == wanted.get(platform):
+            continue
+        if platform in loaded:
+            _LOGGER.debug("Unloading %s for %s", platform, config[CONF_DEVICE_ID])
+            await hass.config_entries.async_forward_entry_unload(entry, platform)
+            for config_id in loaded[platform]:
+                data.pop(config_id, None)
+        if platform in wanted:
+            _LOGGER.debug("Setting up %s for %s", platform, config[CONF_DEVICE_ID])
+            await hass.config_entries.async_forward_entry_setup(entry, platform)
+
+    _async_track_fast_refresh(hass, data["device"], device_conf, config, data)
@@ -56,22 +56,18 @@ class ConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             self.data[CONF_TYPE] = user_input[CONF_TYPE]
             return await self.async_step_choose_entities()
 
-        types = []
-        best_match = 0
-        best_matching_type = None
-
-        async for type in self.device.async_possible_types():
-            types.append(type.config_type)
-            q = type.match_quality(self.device._get_cached_state())
-            if q > best_match:
-                best_match = q
-                best_matching_type = type.config_type
-
-        if best_match < 100:
-            best_match = int(best_match)
-            dps = self.device._get_cached_state()
+        ranked = await self.device.async_ranked_types()
+        types = [m.config.config_type for m in ranked]
+        best_matching_type = types[0] if types else None
+
+        if ranked and ranked[0].quality < 100:
+            unmatched = {
+                k: v for k, v in ranked[0].explanation.items() if v != "matched"
+            }
             _LOGGER.warning(
-                f"Device matches {best_matching_type} with quality of {best_match}%. DPS: {dps}"
+                f"Device matches {best_matching_type} with quality of "
+                f"{ranked[0].quality}%. Unmatched DPS: {unmatched}. "
+                f"DPS: {self.device._get_cached_state()}"
             )
             _LOGGER.warning(
                 f"Report this to https://github.com/make-all/tuya-local/issues/"
@@ -106,6 +102,14 @@ class ConfigFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             data_schema=vol.Schema(schema),
         )
 
+    async def async_step_import(self, import_config):
+        """Create an entry for a device listed in configuration.yaml."""
+        await self.async_set_unique_id(import_config[CONF_DEVICE_ID])
+        self._abort_if_unique_id_configured()
+        data = dict(import_config)
+        title = data.pop(CONF_NAME)
+        return self.async_create_entry(title=title, data=data)
+
     @staticmethod
     @callback
     def async_get_options_flow(config_entry):
@@ -157,5 +161,5 @@ async def async_test_connection(config: dict, hass: HomeAssistant):
     device = TuyaLocalDevice(
         "Test", config[CONF_DEVICE_ID], config[CONF_HOST], config[CONF_LOCAL_KEY], hass
     )
-    await device.async_refresh()
+    await device.async_refresh(wait=True)
     return device if device.has_returned_state else None
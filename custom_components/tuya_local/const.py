@@ -5,6 +5,8 @@ DOMAIN = "tuya_local"
 CONF_DEVICE_ID = "device_id"
 CONF_LOCAL_KEY = "local_key"
 CONF_TYPE = "type"
+CONF_CONFIG_DIR = "config_dir"
+CONF_DEVICES = "devices"
 CONF_CLIMATE = "climate"
 CONF_FAN = "fan"
 CONF_LIGHT = "light"
@@ -13,3 +15,8 @@ CONF_SWITCH = "switch"
 CONF_HUMIDIFIER = "humidifier"
 API_PROTOCOL_VERSIONS = [3.3, 3.1]
 SCAN_INTERVAL = timedelta(seconds=30)
+FAST_REFRESH_INTERVAL = timedelta(seconds=5)
+CONFIG_WATCH_INTERVAL = timedelta(seconds=60)
+SERVICE_DUMP_HISTORY = "dump_history"
+SERVICE_RELOAD_CONFIGS = "reload_configs"
+EVENT_HISTORY = f"{DOMAIN}_history"
@@ -2,11 +2,10 @@
 API for Tuya Local devices.
 """
 
-import json
 import logging
 import tinytuya
 from threading import Lock, Timer
-from time import time
+from time import monotonic, time
 
 
 from homeassistant.const import CONF_HOST, CONF_NAME, TEMP_CELSIUS
@@ -18,7 +17,15 @@ from .const import (
     CONF_LOCAL_KEY,
     DOMAIN,
 )
-from .helpers.device_config import possible_matches
+from .helpers.command_queue import (
+    PRIORITY_CONFIRM,
+    PRIORITY_POLL,
+    PRIORITY_WRITE,
+    CommandCancelled,
+    CommandQueue,
+)
+from .helpers.device_config import best_match, rank_matches
+from .helpers.log import DeviceLogger, LogJson
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -35,10 +42,15 @@ class TuyaLocalDevice(object):
             local_key (str): The encryption key.
         """
         self._name = name
+        self._log = DeviceLogger(_LOGGER)
         self._api_protocol_version_index = None
         self._api_protocol_working = False
         self._api = tinytuya.Device(dev_id, address, local_key)
         self._refresh_task = None
+        self._listeners = []
+        # Whether each dps is sent as a string, learned from the first
+        # state the device reports so values are sent back the same way.
+        self._stringified = {}
         self._rotate_api_protocol_version()
 
         self._reset_cached_state()
@@ -56,7 +68,22 @@ class TuyaLocalDevice(object):
         self._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT = 10
         self._CACHE_TIMEOUT = 20
         self._CONNECTION_ATTEMPTS = 4
-        self._lock = Lock()
+        # Polls and writes share one socket, so they are queued, with writes
+        # first and the read confirming a write ahead of routine polls.
+        self._commands = CommandQueue()
+
+        # Writes are coalesced so only the latest value of each dps is sent,
+        # and rate limited with a token bucket so cheap boards are not
+        # flooded.  A write is sent within _WRITE_DELAY plus the time to
+        # earn a token, however often it is superseded.
+        self._WRITE_DELAY = 0.5
+        self._WRITE_RATE = 1
+        self._WRITE_BURST = 2
+        self._write_lock = Lock()
+        self._write_timer = None
+        self._expiry_timer = None
+        self._write_tokens = self._WRITE_BURST
+        self._write_tokens_at = monotonic()
 
     @property
     def name(self):
@@ -85,61 +112,144 @@ class TuyaLocalDevice(object):
     def temperature_unit(self):
         return self._TEMPERATURE_UNIT
 
-    async def async_possible_types(self):
+    async def _async_detection_state(self):
         cached_state = self._get_cached_state()
         if len(cached_state) <= 1:
-            await self.async_refresh()
+            await self.async_refresh(wait=True)
             cached_state = self._get_cached_state()
+        return cached_state
 
-        for match in possible_matches(cached_state):
-            yield match
+    async def async_ranked_types(self):
+        """Return the configs matching this device, best first."""
+        return rank_matches(await self._async_detection_state())
 
     async def async_inferred_type(self):
-        best_match = None
-        best_quality = 0
-        cached_state = {}
-        async for config in self.async_possible_types():
-            cached_state = self._get_cached_state()
-            quality = config.match_quality(cached_state)
-            _LOGGER.info(
-                f"{self.name} considering {config.name} with quality {quality}"
+        cached_state = await self._async_detection_state()
+        best = best_match(cached_state)
+        if best is None:
+            _LOGGER.warning(
+                "Detection for %s with dps %s failed", self.name, cached_state
             )
-            if quality > best_quality:
-                best_quality = quality
-                best_match = config
-
-        if best_match is None:
-            _LOGGER.warning(f"Detection for {self.name} with dps {cached_state} failed")
             return None
 
-        return best_match.config_type
+        return best.config_type
 
-    async def async_refresh(self):
-        cache = self._get_cached_state()
-        if "updated_at" in cache:
-            last_updated = self._get_cached_state()["updated_at"]
-        else:
-            last_updated = 0
+    async def async_refresh(self, wait=False):
+        """
+        Refresh the device state, without blocking on the network.
 
-        if self._refresh_task is None or time() - last_updated >= self._CACHE_TIMEOUT:
-            self._cached_state["updated_at"] = time()
-            self._refresh_task = self._hass.async_add_executor_job(self.refresh)
+        While the cached state is younger than the cache timeout, this
+        returns immediately.  Once it is stale, one refresh is started in
+        the background and shared by all callers, with changes published to
+        listeners when it completes.  Only callers that need the state
+        straight away, such as type detection, wait for it.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            refresh = self._refresh_task
+        elif time() - self._cached_state.get("updated_at", 0) >= self._CACHE_TIMEOUT:
+            refresh = self._hass.async_add_executor_job(self.refresh)
+            self._refresh_task = refresh
+        else:
+            return
 
-        await self._refresh_task
+        if wait:
+            await refresh
 
     def refresh(self):
-        _LOGGER.debug(f"Refreshing device state for {self.name}.")
+        _LOGGER.debug("Refreshing device state for %s.", self.name)
+        try:
+            self._retry_on_failed_connection(
+                lambda: self._commands.run(PRIORITY_POLL, self._refresh_cached_state),
+                f"Failed to refresh device state for {self.name}.",
+            )
+        except CommandCancelled:
+            _LOGGER.debug("Refresh of %s was superseded by a write.", self.name)
+
+    def _confirm_write(self):
+        """
+        Read the device state back after a write, ahead of any routine
+        polls, so the result of the write is known without waiting for the
+        next one.
+        """
+        _LOGGER.debug("Confirming device state for %s.", self.name)
         self._retry_on_failed_connection(
-            lambda: self._refresh_cached_state(),
-            f"Failed to refresh device state for {self.name}.",
+            lambda: self._commands.run(PRIORITY_CONFIRM, self._refresh_cached_state),
+            f"Failed to confirm device state for {self.name}.",
+        )
+
+    async def async_refresh_dps(self, dps_ids):
+        """Refresh only the given dps, without polling the full status."""
+        await self._hass.async_add_executor_job(self.refresh_dps, dps_ids)
+
+    def refresh_dps(self, dps_ids):
+        """
+        Ask the device to update the given dps with a targeted UPDATEDPS
+        request, and merge their new values into the cached state.
+        Until the device has returned a full status this does nothing.
+        """
+        if not self.has_returned_state:
+            return
+        try:
+            data = self._commands.run(PRIORITY_POLL, lambda: self._update_dps(dps_ids))
+        except CommandCancelled:
+            return
+        except Exception as e:
+            self._log.throttled_debug(
+                "updatedps", "%s failed to update dps %s: %s", self.name, dps_ids, e
+            )
+            return
+
+        if isinstance(data, dict) and isinstance(data.get("dps"), dict):
+            self._merge_cached_state(
+                {k: v for k, v in data["dps"].items() if k in dps_ids}
+            )
+
+    def _update_dps(self, dps_ids):
+        # Most devices only acknowledge the request, then push the updated
+        # values in a separate STATUS message, so keep the connection open
+        # long enough to read it.
+        self._api.set_socketPersistent(True)
+        try:
+            data = self._api.updatedps([int(i) for i in dps_ids])
+            if not (isinstance(data, dict) and isinstance(data.get("dps"), dict)):
+                data = self._api.receive()
+            return data
+        finally:
+            self._api.set_socketPersistent(False)
+            self._api.close()
+
+    def add_listener(self, callback, dps_ids=None, pending=True):
+        """
+        Register a callback to be notified of changes to the device state.
+
+        Args:
+            callback (callable): called with a dict of changed dps ids to
+                (old value, new value) tuples.
+            dps_ids (iterable): the dps ids of interest, or None for all.
+            pending (bool): whether to also be notified of values that were
+                set or anticipated but not yet reported by the device, and
+                of them expiring.
+        Returns:
+            A function that removes the listener when called.
+        """
+        listener = (
+            callback,
+            None if dps_ids is None else frozenset(dps_ids),
+            pending,
         )
+        self._listeners.append(listener)
+
+        def remove_listener():
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+        return remove_listener
 
     def get_property(self, dps_id):
-        cached_state = self._get_cached_state()
-        if dps_id in cached_state:
-            return cached_state[dps_id]
-        else:
-            return None
+        pending_updates = self._get_pending_updates()
+        if dps_id in pending_updates:
+            return pending_updates[dps_id]["value"]
+        return self._cached_state.get(dps_id)
 
     def set_property(self, dps_id, value):
         self._set_properties({dps_id: value})
@@ -157,101 +267,285 @@ class TuyaLocalDevice(object):
 
         The anticipated value will be cleared with the next update.
         """
+        old = self.get_property(dps_id)
         self._cached_state[dps_id] = value
+        self._notify_listeners(
+            self._diff_state({dps_id: old}, {dps_id: self.get_property(dps_id)}),
+            pending=True,
+        )
+
+    def restore_state(self, dps):
+        """
+        Seed the cached state with a previously returned state, so the
+        device has values before it is first polled.  The restored state is
+        treated as stale, so it is revalidated on the first update.
+        """
+        if not self.has_returned_state:
+            self._cached_state = {**dps, "updated_at": 0}
+            self._learn_wire_format(dps)
+
+    def is_stringified(self, dps_id):
+        """Return whether the device reports the dps value as a string."""
+        return self._stringified.get(dps_id, False)
+
+    def _learn_wire_format(self, dps):
+        for dps_id, value in dps.items():
+            if dps_id != "updated_at" and dps_id not in self._stringified:
+                self._stringified[dps_id] = isinstance(value, str)
+
+    def snapshot(self):
+        """Return the last state returned by the device, without pending updates."""
+        return self._cached_state.copy() if self.has_returned_state else {}
 
     def _reset_cached_state(self):
+        old_state = getattr(self, "_cached_state", {})
         self._cached_state = {"updated_at": 0}
+        self._confirmed_state = {}
         self._pending_updates = {}
+        self._unsent = set()
+        self._notify_listeners(self._diff_state(old_state, self._cached_state))
 
     def _refresh_cached_state(self):
         new_state = self._api.status()
+        old_state = self._cached_state
         self._cached_state = new_state["dps"]
         self._cached_state["updated_at"] = time()
-        _LOGGER.debug(f"{self.name} refreshed device state: {json.dumps(new_state)}")
-        _LOGGER.debug(
-            f"new cache state (including pending properties): {json.dumps(self._get_cached_state())}"
+        self._confirmed_state = self._cached_state.copy()
+        self._learn_wire_format(self._cached_state)
+        changes = self._diff_state(old_state, self._cached_state)
+        self._log.throttled_debug(
+            "refresh",
+            "%s refreshed device state: %s",
+            self.name,
+            LogJson(new_state),
+        )
+        self._log.throttled_debug(
+            "cache",
+            "new cache state (including pending properties): %s",
+            LogJson(self._get_cached_state),
         )
+        self._notify_listeners(changes)
+
+    def _merge_cached_state(self, dps):
+        """Merge a partial state reported by the device into the cache."""
+        dps = {k: v for k, v in dps.items() if k != "updated_at"}
+        old_state = {k: self._cached_state.get(k) for k in dps}
+        self._cached_state.update(dps)
+        self._confirmed_state.update(dps)
+        self._learn_wire_format(dps)
+        self._notify_listeners(self._diff_state(old_state, dps))
+
+    @staticmethod
+    def _diff_state(old_state, new_state):
+        """Return the dps that differ between two states as (old, new) tuples."""
+        changes = {}
+        for key in old_state.keys() | new_state.keys():
+            if key == "updated_at":
+                continue
+            old = old_state.get(key)
+            new = new_state.get(key)
+            if old != new or type(old) is not type(new):
+                changes[key] = (old, new)
+        return changes
+
+    def _notify_listeners(self, changes, pending=False):
+        """
+        Pass changed dps to the listeners interested in them.  Changes to
+        pending or anticipated values are only passed to listeners that
+        asked for them.
+        """
+        if not changes:
+            return
+        _LOGGER.debug("%s changed dps: %s", self.name, LogJson(changes))
+        for callback, dps_ids, wants_pending in list(self._listeners):
+            if pending and not wants_pending:
+                continue
+            if dps_ids is None:
+                relevant = changes
+            else:
+                relevant = {k: v for k, v in changes.items() if k in dps_ids}
+            if relevant:
+                try:
+                    callback(relevant)
+                except Exception as e:
+                    _LOGGER.error("%s change listener failed: %s", self.name, e)
 
     def _set_properties(self, properties):
         if len(properties) == 0:
             return
 
-        self._add_properties_to_pending_updates(properties)
-        self._debounce_sending_updates()
+        with self._write_lock:
+            old_state = self._get_cached_state()
+            self._add_properties_to_pending_updates(properties)
+            changes = self._diff_state(old_state, self._get_cached_state())
+        self._notify_listeners(changes, pending=True)
+        self._schedule_sending_updates()
 
     def _add_properties_to_pending_updates(self, properties):
         now = time()
 
-        pending_updates = self._get_pending_updates()
         for key, value in properties.items():
-            pending_updates[key] = {"value": value, "updated_at": now}
+            self._pending_updates[key] = {"value": value, "updated_at": now}
+            self._unsent.add(key)
 
         _LOGGER.debug(
-            f"{self.name} new pending updates: {json.dumps(self._pending_updates)}"
+            "%s new pending updates: %s", self.name, LogJson(self._pending_updates)
         )
 
-    def _debounce_sending_updates(self):
-        try:
-            self._debounce.cancel()
-        except AttributeError:
-            pass
-        self._debounce = Timer(1, self._send_pending_updates)
-        self._debounce.start()
+    def _schedule_sending_updates(self):
+        with self._write_lock:
+            if self._write_timer is not None:
+                # The scheduled send will pick up the latest values.
+                return
+            delay = max(self._WRITE_DELAY, self._time_until_write_token())
+            self._start_write_timer(delay)
+
+    def _start_write_timer(self, delay):
+        self._write_timer = Timer(delay, self._send_pending_updates)
+        self._write_timer.start()
+
+    def stop(self):
+        """Cancel any scheduled write, as the device is being removed."""
+        with self._write_lock:
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+                self._write_timer = None
+            if self._expiry_timer is not None:
+                self._expiry_timer.cancel()
+                self._expiry_timer = None
+
+    def _refill_write_tokens(self):
+        now = monotonic()
+        self._write_tokens = min(
+            self._WRITE_BURST,
+            self._write_tokens + (now - self._write_tokens_at) * self._WRITE_RATE,
+        )
+        self._write_tokens_at = now
+
+    def _time_until_write_token(self):
+        self._refill_write_tokens()
+        return max(0, (1 - self._write_tokens) / self._WRITE_RATE)
 
     def _send_pending_updates(self):
-        pending_properties = self._get_pending_properties()
+        with self._write_lock:
+            self._write_timer = None
+            wait = self._time_until_write_token()
+            if wait > 0:
+                # The token this send was scheduled for has been used.
+                self._start_write_timer(wait)
+                return
+            pending_updates = self._get_pending_updates()
+            pending_properties = {
+                key: pending_updates[key]["value"]
+                for key in self._unsent
+                if key in pending_updates
+            }
+            self._unsent.clear()
+
+            confirmed = self._get_confirmed_state()
+            for key, value in list(pending_properties.items()):
+                if key in confirmed and confirmed[key] == value:
+                    del pending_properties[key]
+            if not pending_properties:
+                _LOGGER.debug("%s skipping update matching device state", self.name)
+                return
+            # Until the device reports again, the sent dps are unconfirmed.
+            for key in pending_properties:
+                self._confirmed_state.pop(key, None)
+            self._write_tokens -= 1
+
         payload = self._api.generate_payload(tinytuya.CONTROL, pending_properties)
 
         _LOGGER.debug(
-            f"{self.name} sending dps update: {json.dumps(pending_properties)}"
+            "%s sending dps update: %s", self.name, LogJson(pending_properties)
         )
 
-        self._retry_on_failed_connection(
+        if self._retry_on_failed_connection(
             lambda: self._send_payload(payload), "Failed to update device state."
-        )
+        ):
+            self._confirm_write()
 
     def _send_payload(self, payload):
-        try:
-            self._lock.acquire()
-            self._api._send_receive(payload)
-            self._cached_state["updated_at"] = 0
-            now = time()
-            pending_updates = self._get_pending_updates()
-            for key, value in pending_updates.items():
-                pending_updates[key]["updated_at"] = now
-        finally:
-            self._lock.release()
+        self._commands.run(PRIORITY_WRITE, lambda: self._send_receive(payload))
+
+    def _send_receive(self, payload):
+        self._api._send_receive(payload)
+        self._cached_state["updated_at"] = 0
+        now = time()
+        pending_updates = self._get_pending_updates()
+        for key, value in pending_updates.items():
+            pending_updates[key]["updated_at"] = now
+        self._schedule_pending_expiry()
+
+    def _schedule_pending_expiry(self):
+        with self._write_lock:
+            if self._expiry_timer is not None:
+                self._expiry_timer.cancel()
+            self._expiry_timer = Timer(
+                self._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT, self._expire_pending_updates
+            )
+            self._expiry_timer.daemon = True
+            self._expiry_timer.start()
+
+    def _expire_pending_updates(self):
+        """
+        Drop the sent updates the device has had time to report, and
+        publish any dps that now show the reported value instead.
+        """
+        with self._write_lock:
+            self._expiry_timer = None
+            old_state = {
+                **self._cached_state,
+                **{k: v["value"] for k, v in self._pending_updates.items()},
+            }
+            self._pending_updates = self._get_pending_updates()
+            changes = self._diff_state(old_state, self._get_cached_state())
+        self._notify_listeners(changes, pending=True)
 
     def _retry_on_failed_connection(self, func, error_message):
+        """Run func, retrying on errors.  Returns True if it succeeded."""
         for i in range(self._CONNECTION_ATTEMPTS):
             try:
                 func()
                 self._api_protocol_working = True
-                break
+                return True
+            except CommandCancelled:
+                raise
             except Exception as e:
-                _LOGGER.debug(f"Retrying after exception {e}")
+                _LOGGER.debug("Retrying after exception %s", e)
                 if i + 1 == self._CONNECTION_ATTEMPTS:
                     self._reset_cached_state()
                     self._api_protocol_working = False
                     _LOGGER.error(error_message)
                 if not self._api_protocol_working:
                     self._rotate_api_protocol_version()
+        return False
 
     def _get_cached_state(self):
         cached_state = self._cached_state.copy()
         return {**cached_state, **self._get_pending_properties()}
 
+    def _get_confirmed_state(self):
+        """
+        Return the dps last reported by the device, if recent enough to
+        trust, excluding anticipated values and anything sent since.
+        """
+        updated_at = self._confirmed_state.get("updated_at", 0)
+        if time() - updated_at >= self._CACHE_TIMEOUT:
+            return {}
+        return self._confirmed_state
+
     def _get_pending_properties(self):
         return {key: info["value"] for key, info in self._get_pending_updates().items()}
 
     def _get_pending_updates(self):
         now = time()
-        self._pending_updates = {
+        return {
             key: value
             for key, value in self._pending_updates.items()
-            if now - value["updated_at"] < self._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT
+            if key in self._unsent
+            or now - value["updated_at"] < self._FAKE_IT_TIL_YOU_MAKE_IT_TIMEOUT
         }
-        return self._pending_updates
 
     def _rotate_api_protocol_version(self):
         if self._api_protocol_version_index is None:
@@ -263,7 +557,7 @@ class TuyaLocalDevice(object):
             self._api_protocol_version_index = 0
 
         new_version = API_PROTOCOL_VERSIONS[self._api_protocol_version_index]
-        _LOGGER.info(f"Setting protocol version for {self.name} to {new_version}.")
+        _LOGGER.info("Setting protocol version for %s to %s.", self.name, new_version)
         self._api.set_version(new_version)
 
     @staticmethod
@@ -276,7 +570,7 @@ class TuyaLocalDevice(object):
 def setup_device(hass: HomeAssistant, config: dict):
     """Setup a tuya device based on passed in config."""
 
-    _LOGGER.info(f"Creating device: {config[CONF_DEVICE_ID]}")
+    _LOGGER.info("Creating device: %s", config[CONF_DEVICE_ID])
     hass.data[DOMAIN] = hass.data.get(DOMAIN, {})
     device = TuyaLocalDevice(
         config[CONF_NAME],
@@ -291,5 +585,5 @@ def setup_device(hass: HomeAssistant, config: dict):
 
 
 def delete_device(hass: HomeAssistant, config: dict):
-    _LOGGER.info(f"Deleting device: {config[CONF_DEVICE_ID]}")
-    del hass.data[DOMAIN][config[CONF_DEVICE_ID]]["device"]
+    _LOGGER.info("Deleting device: %s", config[CONF_DEVICE_ID])
+    hass.data[DOMAIN][config[CONF_DEVICE_ID]].pop("device").stop()
@@ -0,0 +1,27 @@
+"""
+Diagnostics for Tuya Local devices.
+"""
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_DEVICE_ID, CONF_LOCAL_KEY, DOMAIN
+
+try:
+    from homeassistant.components.diagnostics import async_redact_data
+except ImportError:
+    # Home Assistant versions before diagnostics support
+    def async_redact_data(data, to_redact):
+        """Return a copy of data with the values of to_redact keys hidden."""
+        return {k: "**REDACTED**" if k in to_redact else v for k, v in data.items()}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """Return the device state and its recent dps history."""
+    data = hass.data[DOMAIN][entry.data[CONF_DEVICE_ID]]
+    device = data["device"]
+    config = {**entry.data, **entry.options}
+    return {
+        "config": async_redact_data(config, {CONF_LOCAL_KEY}),
+        "state": device.snapshot(),
+        "history": data["history"].as_dicts(),
+    }
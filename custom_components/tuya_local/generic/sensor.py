@@ -1,6 +1,8 @@
 """
 Platform to read Tuya sensors.
 """
+from time import monotonic
+
 from homeassistant.components.sensor import DEVICE_CLASSES, SensorEntity, STATE_CLASSES
 from homeassistant.const import TEMP_CELSIUS, TEMP_FAHRENHEIT
 
@@ -24,6 +26,8 @@ class TuyaLocalSensor(TuyaLocalEntity, SensorEntity):
         if self._sensor_dps is None:
             raise AttributeError(f"{config.name} is missing a sensor dps")
         self._unit_dps = dps_map.pop("unit", None)
+        self._deadband = self._sensor_dps.deadband
+        self._reported = None
 
         self._init_end(dps_map)
 
@@ -48,7 +52,37 @@ class TuyaLocalSensor(TuyaLocalEntity, SensorEntity):
     @property
     def native_value(self):
         """Return the value reported by the sensor"""
-        return self._sensor_dps.get_value(self._device)
+        value = self._sensor_dps.get_value(self._device)
+        if self._deadband is None:
+            return value
+        return self._apply_deadband(value)
+
+    def _apply_deadband(self, value):
+        """
+        Hold the last reported value while readings stay within the
+        deadband, so insignificant changes do not write new states.  The
+        current reading is reported once max_silence seconds have passed.
+        """
+        now = monotonic()
+        if self._reported is not None:
+            last, reported_at = self._reported
+            silence = self._deadband.get("max_silence")
+            if self._within_deadband(last, value) and (
+                silence is None or now - reported_at < silence
+            ):
+                return last
+        self._reported = (value, now)
+        return value
+
+    def _within_deadband(self, last, value):
+        if not _is_number(last) or not _is_number(value):
+            return last == value
+        change = abs(value - last)
+        absolute = self._deadband.get("absolute")
+        relative = self._deadband.get("relative")
+        return (absolute is not None and change <= absolute) or (
+            relative is not None and change <= relative * abs(last)
+        )
 
     @property
     def native_unit_of_measurement(self):
@@ -65,3 +99,7 @@ class TuyaLocalSensor(TuyaLocalEntity, SensorEntity):
             unit = TEMP_FAHRENHEIT
 
         return unit
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -61,7 +61,7 @@ class GoldairHeater(ClimateEntity):
     @property
     def should_poll(self):
         """Return the polling state."""
-        return True
+        return False
 
     @property
     def name(self):
@@ -242,5 +242,15 @@ class GoldairHeater(ClimateEntity):
             error = "OK"
         return {ATTR_ERROR: error, ATTR_ERROR_CODE: error_code}
 
+    async def async_added_to_hass(self):
+        """Write the new state whenever the device reports a change."""
+        self._remove_listener = self._device.add_listener(
+            lambda changes: self.schedule_update_ha_state()
+        )
+
+    async def async_will_remove_from_hass(self):
+        """Stop listening for device changes."""
+        self._remove_listener()
+
     async def async_update(self):
         await self._device.async_refresh()
@@ -0,0 +1,62 @@
+"""
+Serialized access to a Tuya device's socket.
+
+Commands run one at a time, most urgent first, so user writes do not wait
+behind background polls.
+"""
+from heapq import heapify, heappop, heappush
+from itertools import count
+from threading import Condition
+
+PRIORITY_WRITE = 0
+PRIORITY_CONFIRM = 1
+PRIORITY_POLL = 2
+
+
+class CommandCancelled(Exception):
+    """Raised when a queued command is superseded before it runs."""
+
+
+class CommandQueue:
+    """A priority queue of commands, run one at a time by their callers."""
+
+    def __init__(self):
+        self._cond = Condition()
+        self._busy = False
+        self._waiting = []
+        self._seq = count()
+
+    def run(self, priority, func):
+        """
+        Run func once no other command is running and no more urgent one is
+        waiting, and return its result.  Commands of equal priority run in
+        the order they were queued.  Queuing a write cancels queued polls.
+        Raises:
+            CommandCancelled: a queued poll was superseded by a write.
+        """
+        entry = [priority, next(self._seq), False]
+        with self._cond:
+            if priority == PRIORITY_WRITE:
+                for waiting in self._waiting:
+                    if waiting[0] == PRIORITY_POLL:
+                        waiting[2] = True
+                self._cond.notify_all()
+            heappush(self._waiting, entry)
+            while True:
+                if entry[2]:
+                    self._waiting.remove(entry)
+                    heapify(self._waiting)
+                    self._cond.notify_all()
+                    raise CommandCancelled()
+                if not self._busy and self._waiting[0] is entry:
+                    break
+                self._cond.wait()
+            heappop(self._waiting)
+            self._busy = True
+
+        try:
+            return func()
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
@@ -0,0 +1,184 @@
+"""
+Schema for Tuya Local device config files.
+
+Configs are validated when loaded, with defaults filled in and values
+normalized, then frozen so they can be read without further checks.
+"""
+from types import MappingProxyType
+
+import voluptuous as vol
+from voluptuous.humanize import humanize_error
+
+DPS_TYPES = {
+    "boolean": bool,
+    "integer": int,
+    "string": str,
+    "float": float,
+    "bitfield": int,
+}
+
+ENTITY_TYPES = [
+    "binary_sensor",
+    "climate",
+    "cover",
+    "fan",
+    "humidifier",
+    "light",
+    "lock",
+    "number",
+    "select",
+    "sensor",
+    "switch",
+]
+
+
+def _number(value):
+    """Validate a number, excluding bools."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise vol.Invalid(f"expected a number, got {value!r}")
+    return value
+
+
+def _nonzero_number(value):
+    """Validate a number that can be divided by."""
+    if _number(value) == 0:
+        raise vol.Invalid("must not be zero")
+    return value
+
+
+SCALAR = vol.Any(None, bool, int, float, str)
+
+RANGE_SCHEMA = vol.Schema(
+    {
+        vol.Required("min"): _number,
+        vol.Required("max"): _number,
+    }
+)
+
+RULE_SCHEMA = {
+    vol.Optional("dps_val"): SCALAR,
+    vol.Optional("value"): SCALAR,
+    vol.Optional("step"): _nonzero_number,
+    vol.Optional("icon"): str,
+    vol.Optional("icon_priority"): int,
+    vol.Optional("invalid"): bool,
+    vol.Optional("value_redirect"): str,
+    vol.Optional("range"): RANGE_SCHEMA,
+}
+
+CONDITION_SCHEMA = vol.Schema(
+    {
+        **RULE_SCHEMA,
+        vol.Optional("scale"): _nonzero_number,
+        vol.Optional("mapping"): [
+            vol.Schema(
+                {vol.Optional("dps_val"): SCALAR, vol.Optional("value"): SCALAR},
+                extra=vol.ALLOW_EXTRA,
+            )
+        ],
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+MAPPING_SCHEMA = vol.Schema(
+    {
+        **RULE_SCHEMA,
+        vol.Optional("scale", default=1): _nonzero_number,
+        vol.Inclusive("constraint", "condition"): str,
+        vol.Inclusive("conditions", "condition"): [CONDITION_SCHEMA],
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+def _non_negative_number(value):
+    """Validate a number that is not negative."""
+    if _number(value) < 0:
+        raise vol.Invalid("must not be negative")
+    return value
+
+
+DEADBAND_SCHEMA = vol.Schema(
+    {
+        vol.Optional("absolute"): _non_negative_number,
+        vol.Optional("relative"): _non_negative_number,
+        vol.Optional("max_silence"): _non_negative_number,
+    }
+)
+
+DPS_SCHEMA = vol.Schema(
+    {
+        vol.Required("id"): vol.All(vol.Any(int, str), vol.Coerce(str)),
+        vol.Required("name"): str,
+        vol.Required("type"): vol.In(DPS_TYPES),
+        vol.Optional("readonly", default=False): bool,
+        vol.Optional("hidden", default=False): bool,
+        vol.Optional("volatile", default=False): bool,
+        vol.Optional("fast_refresh", default=False): bool,
+        vol.Optional("deadband"): DEADBAND_SCHEMA,
+        vol.Optional("range"): RANGE_SCHEMA,
+        vol.Optional("mapping", default=[]): [MAPPING_SCHEMA],
+        vol.Optional("unit"): str,
+        vol.Optional("class"): str,
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+def _unique_dps_names(dps):
+    names = [d["name"] for d in dps]
+    for name in names:
+        if names.count(name) > 1:
+            raise vol.Invalid(f"duplicate dps name {name}")
+    return dps
+
+
+ENTITY_SCHEMA = vol.Schema(
+    {
+        vol.Required("entity"): vol.In(ENTITY_TYPES),
+        vol.Optional("name"): str,
+        vol.Optional("class"): str,
+        vol.Optional("icon"): str,
+        vol.Optional("icon_priority", default=100): int,
+        vol.Optional("mode"): str,
+        vol.Optional("deprecated"): str,
+        vol.Optional("legacy_class"): str,
+        vol.Required("dps"): vol.All(
+            [DPS_SCHEMA], vol.Length(min=1), _unique_dps_names
+        ),
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+DEVICE_SCHEMA = vol.Schema(
+    {
+        vol.Required("name"): str,
+        vol.Optional("legacy_type"): str,
+        vol.Optional("products"): [dict],
+        vol.Required("primary_entity"): ENTITY_SCHEMA,
+        vol.Optional("secondary_entities", default=[]): [ENTITY_SCHEMA],
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+
+def _freeze(value):
+    """Convert dicts and lists to read-only equivalents."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def compile_config(config, fname):
+    """
+    Validate a loaded device config and return it in frozen form.
+    Raises ValueError describing the problem if the config is invalid.
+    """
+    try:
+        return _freeze(DEVICE_SCHEMA(config))
+    except vol.Invalid as e:
+        raise ValueError(
+            f"Invalid device config {fname}: {humanize_error(config, e)}"
+        ) from e
@@ -1,19 +1,42 @@
 """
 Config parser for Tuya Local devices.
 """
+from collections import namedtuple
 from fnmatch import fnmatch
 import logging
-from os import walk
+from os import stat, walk
 from os.path import join, dirname, splitext, exists
 from pydoc import locate
 
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.util import slugify
 from homeassistant.util.yaml import load_yaml
 
 import custom_components.tuya_local.devices as config_dir
 
+from .config_schema import DPS_TYPES, compile_config
+
 _LOGGER = logging.getLogger(__name__)
 
+# Parsed configs, shared between all devices of the same type.
+_CONFIGS = {}
+# Paths and modification times of the parsed config files, to detect changes.
+_VERSIONS = {}
+# Versions of config files that failed to parse, so each is reported once.
+_FAILED = {}
+# Config file names, listed once until the configs are reloaded.
+_FILES = None
+# Directory of user supplied configs, which take precedence over bundled ones.
+_USER_DIR = None
+# Parsed configs indexed by the set of dps ids they use, for fast detection.
+_INDEX = None
+# Number of icons to remember per entity before starting again.
+_ICON_CACHE_SIZE = 256
+
+# A config matching a device, with its quality and the reason each dps did
+# or did not match.
+ConfigMatch = namedtuple("ConfigMatch", ["config", "quality", "explanation"])
+
 
 def _typematch(type, value):
     # Workaround annoying legacy of bool being a subclass of int in Python
@@ -33,6 +56,19 @@ def _typematch(type, value):
     return False
 
 
+class _StateSnapshot:
+    """A view of device state that fetches each dps at most once."""
+
+    def __init__(self, device):
+        self._device = device
+        self._values = {}
+
+    def get_property(self, dps_id):
+        if dps_id not in self._values:
+            self._values[dps_id] = self._device.get_property(dps_id)
+        return self._values[dps_id]
+
+
 def _scale_range(r, s):
     "Scale range r by factor s"
     if s == 1:
@@ -47,11 +83,21 @@ class TuyaDeviceConfig:
         """Initialize the device config.
         Args:
             fname (string): The filename of the yaml config to load."""
-        _CONFIG_DIR = dirname(config_dir.__file__)
         self._fname = fname
-        filename = join(_CONFIG_DIR, fname)
-        self._config = load_yaml(filename)
+        filename = _config_path(fname)
+        self._config = compile_config(load_yaml(filename), filename)
         _LOGGER.debug("Loaded device config %s", fname)
+        # Compile the entities now, so broken references are found at load.
+        self._primary = TuyaEntityConfig(
+            self, self._config["primary_entity"], primary=True
+        )
+        self._secondary = tuple(
+            TuyaEntityConfig(self, conf) for conf in self._config["secondary_entities"]
+        )
+        self._match_dps = tuple(
+            {(d.id, d.type) for e in self.all_entities() for d in e.dps()}
+        )
+        self._dps_ids = frozenset(d[0] for d in self._match_dps)
 
     @property
     def name(self):
@@ -76,64 +122,55 @@ class TuyaDeviceConfig:
     @property
     def primary_entity(self):
         """Return the primary type of entity for this device."""
-        return TuyaEntityConfig(self, self._config["primary_entity"], primary=True)
+        return self._primary
 
     def secondary_entities(self):
         """Iterate through entites for any secondary entites supported."""
-        for conf in self._config.get("secondary_entities", {}):
-            yield TuyaEntityConfig(self, conf)
+        yield from self._secondary
 
-    def matches(self, dps):
-        """Determine if this device matches the provided dps map."""
-        for d in self.primary_entity.dps():
-            if d.id not in dps.keys() or not _typematch(d.type, dps[d.id]):
-                return False
-
-        for dev in self.secondary_entities():
-            for d in dev.dps():
-                if d.id not in dps.keys() or not _typematch(d.type, dps[d.id]):
-                    return False
-        _LOGGER.debug("Matched config for %s", self.name)
-        return True
+    def all_entities(self):
+        """Iterate through all entities for this device."""
+        yield self.primary_entity
+        yield from self.secondary_entities()
+
+    @property
+    def dps_ids(self):
+        """Return the set of dps ids used by this device."""
+        return self._dps_ids
 
-    def _entity_match_analyse(self, entity, keys, matched, dps):
+    def match(self, dps):
         """
-        Determine whether this entity can be a match for the dps
-          Args:
-            entity - the TuyaEntityConfig to check against
-            keys - the unmatched keys for the device
-            matched - the matched keys for the device
-            dps - the dps values to be matched
-        Side Effects:
-            Moves items from keys to matched if they match dps
-        Return Value:
-            True if all dps in entity could be matched to dps, False otherwise
+        Match the provided dps map against this config in a single pass.
+        Returns:
+            A tuple of the match quality, 0 if the config does not match,
+            and a dict explaining for each dps id why it did or did not
+            match.
         """
-        for d in entity.dps():
-            if (d.id not in keys and d.id not in matched) or not _typematch(
-                d.type, dps[d.id]
-            ):
-                return False
-            if d.id in keys:
-                matched.append(d.id)
-                keys.remove(d.id)
-        return True
+        keys = set(dps.keys())
+        keys.discard("updated_at")
+        explanation = {k: "unused" for k in keys}
+        matched = True
+        for dps_id, dps_type in self._match_dps:
+            if dps_id not in keys:
+                explanation[dps_id] = "missing"
+                matched = False
+            elif not _typematch(dps_type, dps[dps_id]):
+                explanation[dps_id] = f"not {dps_type.__name__}"
+                matched = False
+            elif explanation[dps_id] == "unused":
+                explanation[dps_id] = "matched"
+
+        if not matched:
+            return 0, explanation
+        return round(len(self._dps_ids) * 100 / len(keys)), explanation
+
+    def matches(self, dps):
+        """Determine if this device matches the provided dps map."""
+        return self.match(dps)[0] > 0
 
     def match_quality(self, dps):
         """Determine the match quality for the provided dps map."""
-        keys = list(dps.keys())
-        matched = []
-        if "updated_at" in keys:
-            keys.remove("updated_at")
-        total = len(keys)
-        if not self._entity_match_analyse(self.primary_entity, keys, matched, dps):
-            return 0
-
-        for e in self.secondary_entities():
-            if not self._entity_match_analyse(e, keys, matched, dps):
-                return 0
-
-        return round((total - len(keys)) * 100 / total)
+        return self.match(dps)[0]
 
 
 class TuyaEntityConfig:
@@ -143,6 +180,66 @@ class TuyaEntityConfig:
         self._device = device
         self._config = config
         self._is_primary = primary
+        self._dps = [TuyaDpsConfig(self, d) for d in config["dps"]]
+        self._dps_by_name = {d.name: d for d in self._dps}
+        self._compile_dependencies()
+        self._compile_icon()
+
+    def _compile_dependencies(self):
+        """
+        Build the graph of which dps each decoded value depends on, from the
+        constraint and value_redirect references in the mappings.
+        Raises ValueError for redirects to unknown dps or redirect cycles.
+        """
+        redirects = {}
+        constraints = {}
+        for d in self._dps:
+            constraints[d.name], redirects[d.name] = d._references()
+            for r in redirects[d.name]:
+                if r not in self._dps_by_name:
+                    raise ValueError(
+                        f"{self._device.name}: {d.name} redirects to unknown dps {r}"
+                    )
+
+        resolved = {}
+
+        def resolve(name, visiting):
+            if name in resolved:
+                return resolved[name]
+            if name in visiting:
+                cycle = " -> ".join(visiting + [name])
+                raise ValueError(f"{self._device.name}: value_redirect cycle {cycle}")
+            deps = {self._dps_by_name[name].id}
+            for c in constraints[name]:
+                c_dps = self._dps_by_name.get(c)
+                if c_dps is not None:
+                    deps.add(c_dps.id)
+            for r in redirects[name]:
+                deps |= resolve(r, visiting + [name])
+            resolved[name] = frozenset(deps)
+            return resolved[name]
+
+        for d in self._dps:
+            d._dependencies = resolve(d.name, [])
+
+    def _compile_icon(self):
+        """
+        Find the dps whose values can change the icon, so it can be looked
+        up by their values.  The rules of other dps are always the same.
+        """
+        icon_dps = []
+        for d in self._dps:
+            if not d._affects_icon():
+                continue
+            constraints, _ = d._references()
+            ids = [d.id] + [
+                self._dps_by_name[c].id
+                for c in sorted(constraints)
+                if c in self._dps_by_name
+            ]
+            icon_dps.extend(i for i in ids if i not in icon_dps)
+        self._icon_dps = tuple(icon_dps)
+        self._icons = {}
 
     def name(self, base_name):
         """The friendly name for this entity."""
@@ -214,8 +311,25 @@ class TuyaEntityConfig:
 
     def icon(self, device):
         """Return the icon for this device, with state as given."""
-        icon = self._config.get("icon", None)
-        priority = self._config.get("icon_priority", 100)
+        values = (device.get_property(i) for i in self._icon_dps)
+        key = tuple((type(v), v) for v in values)
+        try:
+            return self._icons[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable values cannot be remembered
+            return self._find_icon(device)
+
+        icon = self._find_icon(device)
+        if len(self._icons) >= _ICON_CACHE_SIZE:
+            self._icons.clear()
+        self._icons[key] = icon
+        return icon
+
+    def _find_icon(self, device):
+        icon = self._config.get("icon")
+        priority = self._config["icon_priority"]
 
         for d in self.dps():
             rule = d.icon_rule(device)
@@ -231,15 +345,38 @@ class TuyaEntityConfig:
 
     def dps(self):
         """Iterate through the list of dps for this entity."""
-        for d in self._config["dps"]:
-            yield TuyaDpsConfig(self, d)
+        for d in self._dps:
+            yield d
 
     def find_dps(self, name):
         """Find a dps with the specified name."""
-        for d in self.dps():
-            if d.name == name:
-                return d
-        return None
+        return self._dps_by_name.get(name)
+
+    def get_values(self, device, dps=None, cache=None):
+        """
+        Decode dps values from a single snapshot of the device state.
+        Args:
+            device: the device to read the state from.
+            dps: the dps to decode, or None for all dps of the entity.
+            cache: optional dict of previously decoded values, which are
+                reused while the dps they depend on are unchanged.
+        Returns:
+            A dict of dps names to decoded values.
+        """
+        snapshot = _StateSnapshot(device)
+        values = {}
+        for d in self._dps if dps is None else dps:
+            if cache is None:
+                values[d.name] = d.get_value(snapshot)
+                continue
+            values_in = (snapshot.get_property(i) for i in d.dependencies)
+            key = tuple((type(v), v) for v in values_in)
+            cached = cache.get(d.name)
+            if cached is None or cached[0] != key:
+                cached = (key, d.get_value(snapshot))
+                cache[d.name] = cached
+            values[d.name] = cached[1]
+        return values
 
 
 class TuyaDpsConfig:
@@ -248,27 +385,42 @@ class TuyaDpsConfig:
     def __init__(self, entity, config):
         self._entity = entity
         self._config = config
-        self.stringify = False
+        self._id = config["id"]
+        self._type = DPS_TYPES[config["type"]]
+        self._name = config["name"]
+        self._mapping = config["mapping"]
+        self._dependencies = frozenset((self._id,))
 
     @property
     def id(self):
-        return str(self._config["id"])
+        return self._id
 
     @property
     def type(self):
-        t = self._config["type"]
-        types = {
-            "boolean": bool,
-            "integer": int,
-            "string": str,
-            "float": float,
-            "bitfield": int,
-        }
-        return types.get(t)
+        return self._type
 
     @property
     def name(self):
-        return self._config["name"]
+        return self._name
+
+    @property
+    def dependencies(self):
+        """Return the ids of all dps that the decoded value depends on."""
+        return self._dependencies
+
+    def _references(self):
+        """Return the names of dps used as constraints and redirects."""
+        constraints = set()
+        redirects = set()
+        for m in self._mapping:
+            if "constraint" in m:
+                constraints.add(m["constraint"])
+            if "value_redirect" in m:
+                redirects.add(m["value_redirect"])
+            for c in m.get("conditions", {}):
+                if "value_redirect" in c:
+                    redirects.add(c["value_redirect"])
+        return constraints, redirects
 
     def get_value(self, device):
         """Return the value of the dps from the given device."""
@@ -286,13 +438,13 @@ class TuyaDpsConfig:
 
     def values(self, device):
         """Return the possible values a dps can take."""
-        if "mapping" not in self._config.keys():
+        if not self._mapping:
             _LOGGER.debug(
-                f"No mapping for {self.name}, unable to determine valid values"
+                "No mapping for %s, unable to determine valid values", self.name
             )
             return None
         val = []
-        for m in self._config["mapping"]:
+        for m in self._mapping:
             if "value" in m:
                 val.append(m["value"])
             for c in m.get("conditions", {}):
@@ -307,10 +459,12 @@ class TuyaDpsConfig:
                         c_val.append(m2["value"])
                 # if given, the conditional mapping is an override
                 if c_val:
-                    _LOGGER.debug(f"Overriding {self.name} values {val} with {c_val}")
+                    _LOGGER.debug(
+                        "Overriding %s values %s with %s", self.name, val, c_val
+                    )
                     val = c_val
                     break
-        _LOGGER.debug(f"{self.name} values: {val}")
+        _LOGGER.debug("%s values: %s", self.name, val)
         return list(set(val)) if val else None
 
     def range(self, device, scaled=True):
@@ -318,50 +472,43 @@ class TuyaDpsConfig:
         mapping = self._find_map_for_dps(device.get_property(self.id))
         scale = 1
         if mapping:
-            _LOGGER.debug(f"Considering mapping for range of {self.name}")
+            _LOGGER.debug("Considering mapping for range of %s", self.name)
             if scaled:
-                scale = mapping.get("scale", scale)
+                scale = mapping["scale"]
             cond = self._active_condition(mapping, device)
             if cond:
-                constraint = mapping.get("constraint")
-                if scaled:
-                    scale = mapping.get("scale", scale)
-                _LOGGER.debug(f"Considering condition on {constraint}")
-            r = None if cond is None else cond.get("range")
-            if r and "min" in r and "max" in r:
-                _LOGGER.info(f"Conditional range returned for {self.name}")
-                return _scale_range(r, scale)
+                _LOGGER.debug("Considering condition on %s", mapping["constraint"])
+                r = cond.get("range")
+                if r:
+                    _LOGGER.info("Conditional range returned for %s", self.name)
+                    return _scale_range(r, scale)
             r = mapping.get("range")
-            if r and "min" in r and "max" in r:
-                _LOGGER.info(f"Mapped range returned for {self.name}")
+            if r:
+                _LOGGER.info("Mapped range returned for %s", self.name)
                 return _scale_range(r, scale)
         r = self._config.get("range")
-        if r and "min" in r and "max" in r:
-            return _scale_range(r, scale)
-        else:
-            return None
+        return _scale_range(r, scale) if r else None
 
     def step(self, device, scaled=True):
         step = 1
         scale = 1
         mapping = self._find_map_for_dps(device.get_property(self.id))
         if mapping:
-            _LOGGER.debug(f"Considering mapping for step of {self.name}")
+            _LOGGER.debug("Considering mapping for step of %s", self.name)
             step = mapping.get("step", 1)
-            scale = mapping.get("scale", 1)
+            scale = mapping["scale"]
             cond = self._active_condition(mapping, device)
             if cond:
-                constraint = mapping.get("constraint")
-                _LOGGER.debug(f"Considering condition on {constraint}")
+                _LOGGER.debug("Considering condition on %s", mapping["constraint"])
                 step = cond.get("step", step)
                 scale = cond.get("scale", scale)
         if step != 1 or scale != 1:
-            _LOGGER.info(f"Step for {self.name} is {step} with scale {scale}")
+            _LOGGER.info("Step for %s is %s with scale %s", self.name, step, scale)
         return step / scale if scaled else step
 
     @property
     def readonly(self):
-        return self._config.get("readonly", False)
+        return self._config["readonly"]
 
     def invalid_for(self, value, device):
         mapping = self._find_map_for_value(value)
@@ -373,7 +520,17 @@ class TuyaDpsConfig:
 
     @property
     def hidden(self):
-        return self._config.get("hidden", False)
+        return self._config["hidden"]
+
+    @property
+    def volatile(self):
+        """Whether the dps changes too often to be recorded as an attribute."""
+        return self._config["volatile"]
+
+    @property
+    def fast_refresh(self):
+        """Whether the dps should be refreshed on the fast cadence."""
+        return self._config["fast_refresh"]
 
     @property
     def unit(self):
@@ -384,9 +541,14 @@ class TuyaDpsConfig:
         """The state class of this measurement."""
         return self._config.get("class")
 
+    @property
+    def deadband(self):
+        """The thresholds below which changes in value are not reported."""
+        return self._config.get("deadband")
+
     def _find_map_for_dps(self, value):
         default = None
-        for m in self._config.get("mapping", {}):
+        for m in self._mapping:
             if "dps_val" not in m:
                 default = m
             elif str(m["dps_val"]) == str(value):
@@ -397,18 +559,13 @@ class TuyaDpsConfig:
         if value is not None and self.type is not str and isinstance(value, str):
             try:
                 value = self.type(value)
-                self.stringify = True
             except ValueError:
-                self.stringify = False
-        else:
-            self.stringify = False
+                pass
 
         result = value
         mapping = self._find_map_for_dps(value)
         if mapping:
-            scale = mapping.get("scale", 1)
-            if not isinstance(scale, (int, float)):
-                scale = 1
+            scale = mapping["scale"]
             redirect = mapping.get("value_redirect")
             replaced = "value" in mapping
             result = mapping.get("value", result)
@@ -427,7 +584,7 @@ class TuyaDpsConfig:
                         result = m.get("value", result)
 
             if redirect:
-                _LOGGER.debug(f"Redirecting {self.name} to {redirect}")
+                _LOGGER.debug("Redirecting %s to %s", self.name, redirect)
                 r_dps = self._entity.find_dps(redirect)
                 return r_dps.get_value(device)
 
@@ -448,7 +605,7 @@ class TuyaDpsConfig:
 
     def _find_map_for_value(self, value):
         default = None
-        for m in self._config.get("mapping", {}):
+        for m in self._mapping:
             if "dps_val" not in m:
                 default = m
             if "value" in m and str(m["value"]) == str(value):
@@ -460,12 +617,11 @@ class TuyaDpsConfig:
 
     def _active_condition(self, mapping, device, value=None):
         constraint = mapping.get("constraint")
-        conditions = mapping.get("conditions")
         c_match = None
-        if constraint and conditions:
+        if constraint:
             c_dps = self._entity.find_dps(constraint)
             c_val = None if c_dps is None else device.get_property(c_dps.id)
-            for cond in conditions:
+            for cond in mapping["conditions"]:
                 if c_val is not None and c_val == cond.get("dps_val"):
                     c_match = cond
                 # when changing, another condition may become active
@@ -482,13 +638,9 @@ class TuyaDpsConfig:
         mapping = self._find_map_for_value(value)
         if mapping:
             replaced = False
-            scale = mapping.get("scale", 1)
+            scale = mapping["scale"]
             redirect = mapping.get("value_redirect")
-            if not isinstance(scale, (int, float)):
-                scale = 1
             step = mapping.get("step")
-            if not isinstance(step, (int, float)):
-                step = None
             if "dps_val" in mapping:
                 result = mapping["dps_val"]
                 replaced = True
@@ -513,12 +665,12 @@ class TuyaDpsConfig:
                 redirect = cond.get("value_redirect", redirect)
 
             if redirect:
-                _LOGGER.debug(f"Redirecting {self.name} to {redirect}")
+                _LOGGER.debug("Redirecting %s to %s", self.name, redirect)
                 r_dps = self._entity.find_dps(redirect)
                 return r_dps.get_values_to_set(device, value)
 
             if scale != 1 and isinstance(result, (int, float)):
-                _LOGGER.debug(f"Scaling {result} by {scale}")
+                _LOGGER.debug("Scaling %s by %s", result, scale)
                 result = result * scale
                 remap = self._find_map_for_value(result)
                 if remap and "dps_val" in remap and "dps_val" not in mapping:
@@ -526,7 +678,7 @@ class TuyaDpsConfig:
                 replaced = True
 
             if step and isinstance(result, (int, float)):
-                _LOGGER.debug(f"Stepping {result} to {step}")
+                _LOGGER.debug("Stepping %s to %s", result, step)
                 result = step * round(float(result) / step)
                 remap = self._find_map_for_value(result)
                 if remap and "dps_val" in remap and "dps_val" not in mapping:
@@ -556,7 +708,7 @@ class TuyaDpsConfig:
                 )
 
         if self.type is int:
-            _LOGGER.debug(f"Rounding {self.name}")
+            _LOGGER.debug("Rounding %s", self.name)
             result = int(round(result))
         elif self.type is bool:
             result = True if result else False
@@ -565,12 +717,22 @@ class TuyaDpsConfig:
         elif self.type is str:
             result = str(result)
 
-        if self.stringify:
+        if device.is_stringified(self.id):
             result = str(result)
 
         dps_map[self.id] = result
         return dps_map
 
+    def _affects_icon(self):
+        """Return whether the mapping of this dps has any icon rules."""
+        for m in self._mapping:
+            if "icon" in m or "icon_priority" in m:
+                return True
+            for c in m.get("conditions", {}):
+                if "icon" in c or "icon_priority" in c:
+                    return True
+        return False
+
     def icon_rule(self, device):
         mapping = self._find_map_for_dps(device.get_property(self.id))
         icon = None
@@ -586,33 +748,235 @@ class TuyaDpsConfig:
         return {"priority": priority, "icon": icon}
 
 
+def set_user_config_dir(path):
+    """
+    Set a directory of user supplied config files, to be used alongside the
+    bundled ones.  A user config with the same file name as a bundled one
+    replaces it.  The change is picked up by the next reload_configs.
+    """
+    global _USER_DIR
+    _USER_DIR = path
+
+
+def _config_dirs():
+    dirs = [dirname(config_dir.__file__)]
+    if _USER_DIR is not None:
+        dirs.append(_USER_DIR)
+    return dirs
+
+
 def available_configs():
     """List the available config files."""
-    _CONFIG_DIR = dirname(config_dir.__file__)
+    global _FILES
+    if _FILES is None:
+        files = set()
+        for config_path in _config_dirs():
+            for (path, dirs, names) in walk(config_path):
+                files.update(b for b in names if fnmatch(b, "*.yaml"))
+        _FILES = sorted(files)
+    return iter(_FILES)
+
+
+def _config_path(fname):
+    """Return the path to a config file, preferring a user supplied one."""
+    for config_path in reversed(_config_dirs()):
+        path = join(config_path, fname)
+        if exists(path):
+            return path
+    return join(dirname(config_dir.__file__), fname)
+
+
+def _file_version(fname):
+    path = _config_path(fname)
+    try:
+        return (path, stat(path).st_mtime)
+    except OSError:
+        return None
+
 
-    for (path, dirs, files) in walk(_CONFIG_DIR):
-        for basename in sorted(files):
-            if fnmatch(basename, "*.yaml"):
-                yield basename
+def _load_config(fname):
+    """
+    Return the parsed config for fname.  Configs are immutable, so they are
+    parsed once and shared between all devices using them.
+    """
+    cfg = _CONFIGS.get(fname)
+    if cfg is None:
+        version = _file_version(fname)
+        cfg = _CONFIGS[fname] = TuyaDeviceConfig(fname)
+        _VERSIONS[fname] = version
+    return cfg
+
+
+def _parse_config(fname, version):
+    """
+    Parse fname, or return None if it is invalid.  A file that fails to
+    parse is reported once, then skipped until it changes.
+    """
+    if fname in _FAILED and _FAILED[fname] == version:
+        return None
+    try:
+        cfg = TuyaDeviceConfig(fname)
+    except (HomeAssistantError, ValueError) as e:
+        _FAILED[fname] = version
+        _LOGGER.error(e)
+        return None
+    _FAILED.pop(fname, None)
+    return cfg
+
+
+def _parse_configs():
+    """Parse the available config files, skipping any that are invalid."""
+    for fname in available_configs():
+        cfg = _CONFIGS.get(fname)
+        if cfg is None:
+            version = _file_version(fname)
+            cfg = _parse_config(fname, version)
+            if cfg is None:
+                continue
+            _CONFIGS[fname] = cfg
+            _VERSIONS[fname] = version
+        yield cfg
+
+
+def _dps_index():
+    """Return the parsed configs indexed by the set of dps ids they use."""
+    global _INDEX
+    if _INDEX is None:
+        index = {}
+        for parsed in _parse_configs():
+            index.setdefault(parsed.dps_ids, []).append(parsed)
+        _INDEX = index
+    return _INDEX
+
+
+def _index_remove(index, cfg):
+    bucket = index.get(cfg.dps_ids, [])
+    if cfg in bucket:
+        bucket.remove(cfg)
+        if not bucket:
+            del index[cfg.dps_ids]
+
+
+def _index_add(index, cfg):
+    bucket = index.setdefault(cfg.dps_ids, [])
+    bucket.append(cfg)
+    bucket.sort(key=lambda c: c.config)
+
+
+def reload_configs():
+    """
+    Pick up config files that were added, changed or removed since they
+    were parsed.  Only those files are parsed again and updated in the
+    index.  A changed file that fails to parse is logged, and the config
+    parsed before is kept.
+    The updates are made to copies of the parsed configs and index, which
+    then replace them at once, so detection running on another thread
+    never sees them half updated.
+    Returns:
+        The set of config types that changed or were removed.
+    """
+    global _FILES, _CONFIGS, _VERSIONS, _INDEX
+    _FILES = None
+    current = set(available_configs())
+    configs = dict(_CONFIGS)
+    versions = dict(_VERSIONS)
+    index = None
+    if _INDEX is not None:
+        index = {ids: list(bucket) for ids, bucket in _INDEX.items()}
+    changed = set()
+
+    for fname in list(configs.keys()):
+        if fname not in current:
+            _LOGGER.info("Device config %s removed", fname)
+            old = configs.pop(fname)
+            versions.pop(fname, None)
+            if index is not None:
+                _index_remove(index, old)
+            changed.add(old.config_type)
+            continue
+
+        version = _file_version(fname)
+        if version == versions.get(fname):
+            continue
+        cfg = _parse_config(fname, version)
+        if cfg is None:
+            continue
+        _LOGGER.info("Device config %s changed", fname)
+        old = configs[fname]
+        configs[fname] = cfg
+        versions[fname] = version
+        if index is not None:
+            _index_remove(index, old)
+            _index_add(index, cfg)
+        changed.add(cfg.config_type)
+
+    for fname in _FAILED.keys() - current:
+        del _FAILED[fname]
+
+    if index is not None:
+        for fname in sorted(current - configs.keys()):
+            version = _file_version(fname)
+            cfg = _parse_config(fname, version)
+            if cfg is not None:
+                _LOGGER.info("Device config %s added", fname)
+                configs[fname] = cfg
+                versions[fname] = version
+                _index_add(index, cfg)
+
+    _CONFIGS, _VERSIONS, _INDEX = configs, versions, index
+    return changed
 
 
 def possible_matches(dps):
     """Return possible matching configs for a given set of dps values."""
-    for cfg in available_configs():
-        parsed = TuyaDeviceConfig(cfg)
+    for parsed in _parse_configs():
         if parsed.matches(dps):
             yield parsed
 
 
+def rank_matches(dps):
+    """
+    Rank the configs matching the given dps values, best first, with equal
+    matches in config file order.  A perfect match uses exactly the dps the
+    device returned, so when only one config does, it is returned alone
+    without checking the rest.
+    Returns:
+        A list of ConfigMatch.
+    """
+    keys = frozenset(dps.keys()) - {"updated_at"}
+    results = {parsed: parsed.match(dps) for parsed in _dps_index().get(keys, ())}
+    perfect = [p for p, (q, _) in results.items() if q == 100]
+    if len(perfect) == 1:
+        return [ConfigMatch(perfect[0], *results[perfect[0]])]
+
+    ranked = []
+    for parsed in _parse_configs():
+        if not parsed.dps_ids <= keys:
+            continue
+        quality, explanation = results.get(parsed) or parsed.match(dps)
+        if quality:
+            _LOGGER.debug("Matched config for %s", parsed.name)
+            ranked.append(ConfigMatch(parsed, quality, explanation))
+    ranked.sort(key=lambda m: -m.quality)
+    return ranked
+
+
+def best_match(dps):
+    """Return the config that best matches the given dps values, or None."""
+    ranked = rank_matches(dps)
+    for m in ranked:
+        _LOGGER.info("Considering %s with quality %s", m.config.name, m.quality)
+    return ranked[0].config if ranked else None
+
+
 def get_config(conf_type):
     """
     Return a config to use with config_type.
     """
-    _CONFIG_DIR = dirname(config_dir.__file__)
     fname = conf_type + ".yaml"
-    fpath = join(_CONFIG_DIR, fname)
+    fpath = _config_path(fname)
     if exists(fpath):
-        return TuyaDeviceConfig(fname)
+        return _load_config(fname)
     else:
         return config_for_legacy_use(conf_type)
 
@@ -624,8 +988,7 @@ def config_for_legacy_use(conf_type):
     to be the correct config for the device, so only use it for looking up
     the legacy class during the transition period.
     """
-    for cfg in available_configs():
-        parsed = TuyaDeviceConfig(cfg)
+    for parsed in _parse_configs():
         if parsed.legacy_type == conf_type:
             return parsed
 
@@ -0,0 +1,89 @@
+"""
+Construction of entities for Tuya Local devices, shared by all platforms.
+
+The device config is walked once per config entry, building every enabled
+entity, and each platform is handed its prebuilt entities when it is set up.
+"""
+import logging
+from pydoc import locate
+
+from ..const import CONF_DEVICE_ID, CONF_TYPE, DOMAIN
+from .device_config import get_config
+
+_LOGGER = logging.getLogger(__name__)
+
+ENTITY_CLASSES = {
+    "binary_sensor": "generic.binary_sensor.TuyaLocalBinarySensor",
+    "climate": "generic.climate.TuyaLocalClimate",
+    "cover": "generic.cover.TuyaLocalCover",
+    "fan": "generic.fan.TuyaLocalFan",
+    "humidifier": "generic.humidifier.TuyaLocalHumidifier",
+    "light": "generic.light.TuyaLocalLight",
+    "lock": "generic.lock.TuyaLocalLock",
+    "number": "generic.number.TuyaLocalNumber",
+    "select": "generic.select.TuyaLocalSelect",
+    "sensor": "generic.sensor.TuyaLocalSensor",
+    "switch": "generic.switch.TuyaLocalSwitch",
+}
+
+
+def create_entities(device, device_conf, config, platform=None):
+    """
+    Build the enabled entities for a device in a single pass over its config.
+    Args:
+        device (TuyaLocalDevice): the device the entities belong to.
+        device_conf (TuyaDeviceConfig): the config for the device.
+        config (dict): the config entry options enabling each entity.
+        platform (string): only build entities for this platform.
+    Returns:
+        A dict of platform to a dict of config_id to entity.
+    """
+    entities = {}
+    classes = {}
+    for ecfg in device_conf.all_entities():
+        if platform is not None and ecfg.entity != platform:
+            continue
+        if not config.get(ecfg.config_id, False):
+            continue
+
+        legacy_class = ecfg.legacy_class
+        if legacy_class is None:
+            cls = classes.get(ecfg.entity)
+            if cls is None:
+                cls = classes[ecfg.entity] = locate(
+                    "custom_components.tuya_local." + ENTITY_CLASSES[ecfg.entity]
+                )
+            entity = cls(device, ecfg)
+        else:
+            entity = legacy_class(device)
+
+        entities.setdefault(ecfg.entity, {})[ecfg.config_id] = entity
+        if ecfg.deprecated:
+            _LOGGER.warning(ecfg.deprecation_message)
+        _LOGGER.debug("Adding %s for %s", ecfg.entity, ecfg.config_id)
+
+    return entities
+
+
+async def async_setup_platform_entities(
+    hass, platform, async_add_entities, discovery_info
+):
+    """
+    Add the entities of a device for a platform, using the entities prebuilt
+    when the config entry was set up if there are any.
+    """
+    data = hass.data[DOMAIN][discovery_info[CONF_DEVICE_ID]]
+    device = data["device"]
+    entities = data.get("entities", {}).pop(platform, None)
+    if entities is None:
+        cfg = get_config(discovery_info[CONF_TYPE])
+        if cfg is None:
+            raise ValueError(f"No device config found for {discovery_info}")
+        entities = create_entities(device, cfg, discovery_info, platform)
+        entities = entities.get(platform, {})
+
+    if not entities:
+        raise ValueError(f"{device.name} does not support use as a {platform} device.")
+
+    data.update(entities)
+    async_add_entities(list(entities.values()))
@@ -0,0 +1,119 @@
+"""
+Compact history of the dps values reported by a device, for troubleshooting.
+
+Values are kept in a fixed size ring buffer of array-backed columns, with
+dps ids and string values interned, so a long history costs little memory.
+"""
+from array import array
+from threading import Lock
+from time import time
+
+HISTORY_SIZE = 1000
+
+_NONE = 0
+_BOOL = 1
+_INT = 2
+_FLOAT = 3
+_STR = 4
+
+
+class DpsHistory:
+    """Ring buffer of timestamped dps values for one device."""
+
+    def __init__(self, size=HISTORY_SIZE):
+        self._size = size
+        self._times = array("d", bytes(8 * size))
+        self._ids = array("L", bytes(array("L").itemsize * size))
+        self._kinds = array("b", bytes(size))
+        self._values = array("d", bytes(8 * size))
+        self._count = 0
+        self._next = 0
+        self._strings = []
+        self._string_index = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return self._count
+
+    def record(self, changes, when=None):
+        """
+        Record the new values from a dict of dps changes, as passed to
+        device listeners.
+        """
+        when = time() if when is None else when
+        with self._lock:
+            for dps_id, change in changes.items():
+                self._append(when, dps_id, change[1])
+
+    def entries(self, dps_id=None):
+        """Return the recorded (time, dps_id, value) tuples, oldest first."""
+        with self._lock:
+            start = (self._next - self._count) % self._size
+            result = []
+            for n in range(self._count):
+                i = (start + n) % self._size
+                entry_id = self._strings[self._ids[i]]
+                if dps_id is None or entry_id == dps_id:
+                    result.append((self._times[i], entry_id, self._value(i)))
+            return result
+
+    def as_dicts(self, dps_id=None):
+        """Return the recorded values in a JSON serializable form."""
+        return [{"time": t, "dps": i, "value": v} for t, i, v in self.entries(dps_id)]
+
+    def _append(self, when, dps_id, value):
+        i = self._next
+        self._times[i] = when
+        self._ids[i] = self._intern(dps_id)
+        if value is None:
+            self._kinds[i] = _NONE
+            self._values[i] = 0
+        elif isinstance(value, bool):
+            self._kinds[i] = _BOOL
+            self._values[i] = value
+        elif isinstance(value, int) and abs(value) < 2**53:
+            self._kinds[i] = _INT
+            self._values[i] = value
+        elif isinstance(value, float):
+            self._kinds[i] = _FLOAT
+            self._values[i] = value
+        else:
+            self._kinds[i] = _STR
+            self._values[i] = self._intern(str(value))
+
+        self._next = (i + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+        if len(self._strings) > 2 * self._size:
+            self._compact_strings()
+
+    def _value(self, i):
+        kind = self._kinds[i]
+        value = self._values[i]
+        if kind == _BOOL:
+            return bool(value)
+        if kind == _INT:
+            return int(value)
+        if kind == _FLOAT:
+            return value
+        if kind == _STR:
+            return self._strings[int(value)]
+        return None
+
+    def _intern(self, s):
+        index = self._string_index.get(s)
+        if index is None:
+            index = self._string_index[s] = len(self._strings)
+            self._strings.append(s)
+        return index
+
+    def _compact_strings(self):
+        """Drop interned strings that are no longer referenced."""
+        strings = self._strings
+        self._strings = []
+        self._string_index = {}
+        start = (self._next - self._count) % self._size
+        for n in range(self._count):
+            i = (start + n) % self._size
+            self._ids[i] = self._intern(strings[self._ids[i]])
+            if self._kinds[i] == _STR:
+                self._values[i] = self._intern(strings[int(self._values[i])])
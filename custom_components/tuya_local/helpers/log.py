@@ -0,0 +1,68 @@
+"""
+Logging helpers for Tuya Local devices.
+"""
+import json
+import logging
+from time import monotonic
+
+
+class LogJson:
+    """
+    Defer JSON serialization of a value until the log record is formatted.
+    If a callable is passed, it is only called at that point to produce the
+    value.
+    """
+
+    __slots__ = ("_value",)
+
+    def __init__(self, value):
+        self._value = value
+
+    def __str__(self):
+        value = self._value() if callable(self._value) else self._value
+        return json.dumps(value, default=str)
+
+
+class DeviceLogger:
+    """
+    Logger for a single device, with lazy formatting and rate limiting of
+    high frequency messages.
+    """
+
+    def __init__(self, logger, interval=60):
+        """
+        Initialize the logger.
+        Args:
+            logger (Logger): the module logger to send records to.
+            interval (float): minimum seconds between throttled messages
+                with the same key.
+        """
+        self._logger = logger
+        self._interval = interval
+        self._last = {}
+        self._suppressed = {}
+
+    def throttled(self, key, level, msg, *args):
+        """
+        Log a message at most once per interval for the given key.
+        The number of messages suppressed since the last one logged is
+        appended to the next message that gets through.
+        """
+        if not self._logger.isEnabledFor(level):
+            return
+
+        now = monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self._interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+
+        self._last[key] = now
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            msg = msg + " (%d similar messages suppressed)"
+            args = args + (suppressed,)
+        self._logger.log(level, msg, *args)
+
+    def throttled_debug(self, key, msg, *args):
+        self.throttled(key, logging.DEBUG, msg, *args)
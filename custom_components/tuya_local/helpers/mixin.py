@@ -13,16 +13,18 @@ class TuyaLocalEntity:
         self._device = device
         self._config = config
         self._attr_dps = []
+        self._remove_listener = None
+        self._decoded = {}
         return {c.name: c for c in config.dps()}
 
     def _init_end(self, dps):
         for d in dps.values():
-            if not d.hidden:
+            if not d.hidden and not d.volatile:
                 self._attr_dps.append(d)
 
     @property
     def should_poll(self):
-        return True
+        return False
 
     @property
     def available(self):
@@ -60,10 +62,24 @@ class TuyaLocalEntity:
     @property
     def device_state_attributes(self):
         """Get additional attributes that the platform itself does not support."""
-        attr = {}
-        for a in self._attr_dps:
-            attr[a.name] = a.get_value(self._device)
-        return attr
+        return self._config.get_values(self._device, self._attr_dps, self._decoded)
+
+    async def async_added_to_hass(self):
+        """Subscribe to changes in the dps used by this entity."""
+        self._remove_listener = self._device.add_listener(
+            self._handle_dps_changes,
+            [d.id for d in self._config.dps()],
+        )
+
+    async def async_will_remove_from_hass(self):
+        """Unsubscribe from dps changes."""
+        if self._remove_listener:
+            self._remove_listener()
+            self._remove_listener = None
+
+    def _handle_dps_changes(self, changes):
+        """Write the new state when any of this entity's dps change."""
+        self.schedule_update_ha_state()
 
     async def async_update(self):
         await self._device.async_refresh()
@@ -0,0 +1,92 @@
+"""
+Persistent store of the last known state of Tuya Local devices.
+
+Devices are seeded from their snapshot when they are set up, so entities
+are available with their last known values before the first poll.
+"""
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from ..const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_SNAPSHOT_STORE = f"{DOMAIN}_snapshots"
+STORAGE_KEY = f"{DOMAIN}.snapshots"
+STORAGE_VERSION = 1
+SAVE_DELAY = 30
+
+
+class SnapshotStore:
+    """Store of the last dps snapshot returned by each device."""
+
+    def __init__(self, hass: HomeAssistant):
+        self._hass = hass
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._snapshots = {}
+        self._load_task = None
+
+    async def async_load(self):
+        """Load the stored snapshots, once."""
+        if self._load_task is None:
+            self._load_task = self._hass.async_create_task(self._async_load())
+        await self._load_task
+
+    async def _async_load(self):
+        data = await self._store.async_load()
+        if data:
+            self._snapshots = data.get("devices", {})
+        _LOGGER.debug("Loaded %d device snapshots", len(self._snapshots))
+
+    def get(self, device_id):
+        """Return the last stored dps for the device, or None."""
+        snapshot = self._snapshots.get(device_id)
+        return None if snapshot is None else snapshot["dps"]
+
+    @callback
+    def async_track(self, device):
+        """
+        Restore the device's last known state, and keep the snapshot up to
+        date as the device state changes.
+        Returns:
+            A function to stop tracking the device.
+        """
+        snapshot = self._snapshots.get(device.unique_id)
+        if snapshot:
+            device.restore_state(snapshot["dps"])
+
+        def state_changed(changes):
+            self._hass.add_job(self._async_update, device)
+
+        return device.add_listener(state_changed, pending=False)
+
+    @callback
+    def async_remove(self, device_id):
+        """Remove the snapshot for a device that is no longer configured."""
+        if self._snapshots.pop(device_id, None) is not None:
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _async_update(self, device):
+        state = device.snapshot()
+        if not state:
+            # Keep the last known state when the device goes offline.
+            return
+        updated_at = state.pop("updated_at", 0)
+        self._snapshots[device.unique_id] = {"dps": state, "updated_at": updated_at}
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self):
+        return {"devices": self._snapshots}
+
+
+async def async_get_snapshot_store(hass: HomeAssistant):
+    """Return the snapshot store, loading it on first use."""
+    store = hass.data.get(DATA_SNAPSHOT_STORE)
+    if store is None:
+        store = hass.data[DATA_SNAPSHOT_STORE] = SnapshotStore(hass)
+    await store.async_load()
+    return store
@@ -1,5 +1,5 @@
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from homeassistant.components.climate.const import (
     ATTR_FAN_MODE,
@@ -58,7 +58,7 @@ class TestGoldairDehumidifier(IsolatedAsyncioTestCase):
         )
 
     def test_should_poll(self):
-        self.assertTrue(self.subject.should_poll)
+        self.assertFalse(self.subject.should_poll)
 
     def test_name_returns_device_name(self):
         self.assertEqual(self.subject.name, self.subject._device.name)
@@ -593,6 +593,18 @@ class TestGoldairDehumidifier(IsolatedAsyncioTestCase):
             },
         )
 
+    async def test_writes_state_when_device_changes(self):
+        self.subject.schedule_update_ha_state = MagicMock()
+        remove = self.subject._device.add_listener.return_value
+
+        await self.subject.async_added_to_hass()
+        changed = self.subject._device.add_listener.call_args[0][0]
+        changed({"1": (False, True)})
+        self.subject.schedule_update_ha_state.assert_called_once()
+
+        await self.subject.async_will_remove_from_hass()
+        remove.assert_called_once()
+
     async def test_update(self):
         result = AsyncMock()
         self.subject._device.async_refresh.return_value = result()
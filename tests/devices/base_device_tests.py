@@ -46,6 +46,10 @@ class TuyaDeviceTestCase(IsolatedAsyncioTestCase):
         self.mock_device = device_patcher.start()
         self.dps = payload.copy()
         self.mock_device.get_property.side_effect = lambda id: self.dps[id]
+        # The wire format is learned from the first state the device reports.
+        self.mock_device.is_stringified.side_effect = lambda id: isinstance(
+            payload.get(id), str
+        )
         cfg = TuyaDeviceConfig(config_file)
         self.conf_type = cfg.legacy_type
         type(self.mock_device).has_returned_state = PropertyMock(return_value=True)
@@ -77,7 +81,7 @@ class TuyaDeviceTestCase(IsolatedAsyncioTestCase):
 
     def test_should_poll(self):
         for e in self.entities.values():
-            self.assertTrue(e.should_poll)
+            self.assertFalse(e.should_poll)
 
     def test_available(self):
         for e in self.entities.values():
@@ -206,35 +206,35 @@ class TestElectriq12WMINVHeatpump(
     async def test_set_fan_mode_to_auto(self):
         async with assert_device_properties_set(
             self.subject._device,
-            {FAN_DPS: 1},
+            {FAN_DPS: "1"},
         ):
             await self.subject.async_set_fan_mode("auto")
 
     async def test_set_fan_mode_to_turbo(self):
         async with assert_device_properties_set(
             self.subject._device,
-            {FAN_DPS: 2},
+            {FAN_DPS: "2"},
         ):
             await self.subject.async_set_fan_mode("Turbo")
 
     async def test_set_fan_mode_to_low(self):
         async with assert_device_properties_set(
             self.subject._device,
-            {FAN_DPS: 3},
+            {FAN_DPS: "3"},
         ):
             await self.subject.async_set_fan_mode("low")
 
     async def test_set_fan_mode_to_medium(self):
         async with assert_device_properties_set(
             self.subject._device,
-            {FAN_DPS: 4},
+            {FAN_DPS: "4"},
         ):
             await self.subject.async_set_fan_mode("medium")
 
     async def test_set_fan_mode_to_high(self):
         async with assert_device_properties_set(
             self.subject._device,
-            {FAN_DPS: 5},
+            {FAN_DPS: "5"},
         ):
             await self.subject.async_set_fan_mode("high")
 
@@ -217,19 +217,23 @@ class TestGoldairFan(BasicLightTests, SwitchableTests, TuyaDeviceTestCase):
 
     async def test_set_speed_in_normal_mode(self):
         self.dps[PRESET_DPS] = "normal"
-        async with assert_device_properties_set(self.subject._device, {FANMODE_DPS: 3}):
+        async with assert_device_properties_set(
+            self.subject._device, {FANMODE_DPS: "3"}
+        ):
             await self.subject.async_set_percentage(25)
 
     async def test_set_speed_in_normal_mode_snaps(self):
         self.dps[PRESET_DPS] = "normal"
         async with assert_device_properties_set(
-            self.subject._device, {FANMODE_DPS: 10}
+            self.subject._device, {FANMODE_DPS: "10"}
         ):
             await self.subject.async_set_percentage(80)
 
     async def test_set_speed_in_sleep_mode_snaps(self):
         self.dps[PRESET_DPS] = "sleep"
-        async with assert_device_properties_set(self.subject._device, {FANMODE_DPS: 8}):
+        async with assert_device_properties_set(
+            self.subject._device, {FANMODE_DPS: "8"}
+        ):
             await self.subject.async_set_percentage(75)
 
     def test_climate_fan_modes(self):
@@ -265,7 +269,7 @@ class TestGoldairFan(BasicLightTests, SwitchableTests, TuyaDeviceTestCase):
 
         async with assert_device_properties_set(
             self.climate._device,
-            {FANMODE_DPS: 6},
+            {FANMODE_DPS: "6"},
         ):
             await self.climate.async_set_fan_mode(6)
 
@@ -289,7 +293,7 @@ class TestGoldairFan(BasicLightTests, SwitchableTests, TuyaDeviceTestCase):
 
         async with assert_device_properties_set(
             self.climate._device,
-            {FANMODE_DPS: 4},
+            {FANMODE_DPS: "4"},
         ):
             await self.climate.async_set_fan_mode("low")
 
@@ -313,7 +317,7 @@ class TestGoldairFan(BasicLightTests, SwitchableTests, TuyaDeviceTestCase):
 
         async with assert_device_properties_set(
             self.climate._device,
-            {FANMODE_DPS: 8},
+            {FANMODE_DPS: "8"},
         ):
             await self.climate.async_set_fan_mode("medium")
 
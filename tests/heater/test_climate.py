@@ -1,5 +1,5 @@
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from homeassistant.components.climate.const import (
     ATTR_HVAC_MODE,
@@ -55,7 +55,7 @@ class TestGoldairHeater(IsolatedAsyncioTestCase):
         )
 
     def test_should_poll(self):
-        self.assertTrue(self.subject.should_poll)
+        self.assertFalse(self.subject.should_poll)
 
     def test_name_returns_device_name(self):
         self.assertEqual(self.subject.name, self.subject._device.name)
@@ -399,6 +399,18 @@ class TestGoldairHeater(IsolatedAsyncioTestCase):
             {ATTR_ERROR_CODE: 0, ATTR_ERROR: "OK"},
         )
 
+    async def test_writes_state_when_device_changes(self):
+        self.subject.schedule_update_ha_state = MagicMock()
+        remove = self.subject._device.add_listener.return_value
+
+        await self.subject.async_added_to_hass()
+        changed = self.subject._device.add_listener.call_args[0][0]
+        changed({"1": (False, True)})
+        self.subject.schedule_update_ha_state.assert_called_once()
+
+        await self.subject.async_will_remove_from_hass()
+        remove.assert_called_once()
+
     async def test_update(self):
         result = AsyncMock()
         self.subject._device.async_refresh.return_value = result()
@@ -3,7 +3,17 @@ from ..helpers import assert_device_properties_set
 
 
 class BasicNumberTests:
-    def setUpBasicNumber(self, dps, subject, max, min=0, step=1, mode="auto", scale=1):
+    def setUpBasicNumber(
+        self,
+        dps,
+        subject,
+        max,
+        min=0,
+        step=1,
+        mode="auto",
+        scale=1,
+        stringify=False,
+    ):
         self.basicNumber = subject
         self.basicNumberDps = dps
         self.basicNumberMin = min
@@ -11,6 +21,7 @@ class BasicNumberTests:
         self.basicNumberStep = step
         self.basicNumberMode = mode
         self.basicNumberScale = scale
+        self.basicNumberStringify = stringify
 
     def test_number_min_value(self):
         self.assertEqual(self.basicNumber.min_value, self.basicNumberMin)
@@ -33,6 +44,8 @@ class BasicNumberTests:
     async def test_number_set_value(self):
         val = min(max(self.basicNumberMin, self.basicNumberStep), self.basicNumberMax)
         dps_val = val * self.basicNumberScale
+        if self.basicNumberStringify:
+            dps_val = str(dps_val)
         async with assert_device_properties_set(
             self.basicNumber._device, {self.basicNumberDps: dps_val}
         ):
@@ -0,0 +1,52 @@
+"""Tests for the detection benchmark, over the corpus from the device tests."""
+import json
+import re
+from glob import glob
+from os.path import dirname, join
+from unittest import TestCase
+
+from tools import benchmark
+
+from . import const
+
+CORPUS = join(dirname(__file__), "detection_corpus.jsonl")
+
+# Configs for devices that return identical dps, so cannot be told apart
+KNOWN_AMBIGUITIES = [
+    ["beca_bhp6000_thermostat_c", "beca_bhp6000_thermostat_f"],
+    ["bwt_heatpump", "poolex_vertigo_heatpump", "remora_heatpump"],
+]
+
+
+class TestBenchmark(TestCase):
+    def setUp(self):
+        with open(CORPUS) as f:
+            self.samples = benchmark.load_corpus(f)
+
+    def test_corpus_covers_device_tests(self):
+        expected = []
+        for fname in sorted(glob(join(dirname(__file__), "devices", "test_*.py"))):
+            with open(fname) as f:
+                for cfg, payload in re.findall(
+                    r'setUpForConfig\(\s*"([^"]+)",\s*(\w+)', f.read()
+                ):
+                    expected.append((cfg[:-5], getattr(const, payload)))
+        self.assertCountEqual(self.samples, expected)
+
+    def test_detection_accuracy(self):
+        report = benchmark.run(self.samples)
+        self.assertEqual(report["failures"], [])
+        self.assertEqual(report["unmatched"], 0)
+        self.assertEqual(report["correct"] + report["shadowed"], report["labelled"])
+        for types in report["ambiguities"]:
+            self.assertIn(types, KNOWN_AMBIGUITIES)
+
+    def test_unlabelled_samples_are_not_scored(self):
+        report = benchmark.run([(None, {"1": True})])
+        self.assertEqual(report["labelled"], 0)
+        self.assertIsNone(report["accuracy"])
+        self.assertEqual(report["samples"], 1)
+
+    def test_reads_scanner_snapshots(self):
+        line = json.dumps({"device_id": "abc", "dps": {"1": True}, "matches": []})
+        self.assertEqual(benchmark.load_corpus([line, ""]), [(None, {"1": True})])
@@ -0,0 +1,74 @@
+"""Tests for the device command queue."""
+from threading import Event, Thread
+from time import sleep
+from unittest import TestCase
+
+from custom_components.tuya_local.helpers.command_queue import (
+    PRIORITY_CONFIRM,
+    PRIORITY_POLL,
+    PRIORITY_WRITE,
+    CommandCancelled,
+    CommandQueue,
+)
+
+
+class TestCommandQueue(TestCase):
+    def setUp(self):
+        self.subject = CommandQueue()
+        self.ran = []
+        self.cancelled = []
+        self.release = Event()
+        self.threads = []
+        self.start(PRIORITY_POLL, "blocker", self.release.wait)
+        self.wait_for(lambda: self.subject._busy)
+
+    def tearDown(self):
+        self.release.set()
+        for t in self.threads:
+            t.join(2)
+
+    def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            sleep(0.01)
+        self.fail("timed out waiting for the queue")
+
+    def start(self, priority, name, func=None):
+        def run():
+            try:
+                self.subject.run(priority, func or (lambda: self.ran.append(name)))
+            except CommandCancelled:
+                self.cancelled.append(name)
+
+        t = Thread(target=run)
+        t.start()
+        self.threads.append(t)
+
+    def test_returns_result(self):
+        self.release.set()
+        self.assertEqual(self.subject.run(PRIORITY_POLL, lambda: 42), 42)
+
+    def test_runs_most_urgent_first(self):
+        self.start(PRIORITY_CONFIRM, "confirm")
+        self.wait_for(lambda: len(self.subject._waiting) == 1)
+        self.start(PRIORITY_WRITE, "write1")
+        self.wait_for(lambda: len(self.subject._waiting) == 2)
+        self.start(PRIORITY_WRITE, "write2")
+        self.wait_for(lambda: len(self.subject._waiting) == 3)
+
+        self.release.set()
+        self.wait_for(lambda: len(self.ran) == 3)
+        self.assertEqual(self.ran, ["write1", "write2", "confirm"])
+
+    def test_write_cancels_queued_polls(self):
+        self.start(PRIORITY_POLL, "poll")
+        self.start(PRIORITY_CONFIRM, "confirm")
+        self.wait_for(lambda: len(self.subject._waiting) == 2)
+        self.start(PRIORITY_WRITE, "write")
+        self.wait_for(lambda: self.cancelled == ["poll"])
+
+        self.release.set()
+        self.wait_for(lambda: len(self.ran) == 2)
+        self.assertEqual(self.ran, ["write", "confirm"])
+        self.assertEqual(self.subject._waiting, [])
@@ -2,6 +2,7 @@
 from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
 from homeassistant.const import CONF_HOST, CONF_NAME
+from homeassistant.setup import async_setup_component
 import pytest
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 
@@ -23,7 +24,10 @@ from custom_components.tuya_local.const import (
     CONF_SWITCH,
     CONF_TYPE,
     DOMAIN,
+    SCAN_INTERVAL,
 )
+import custom_components.tuya_local.helpers.device_config as device_config
+from custom_components.tuya_local.helpers.device_config import ConfigMatch
 
 
 @pytest.fixture(autouse=True)
@@ -65,6 +69,153 @@ async def test_init_entry(hass):
     assert hass.states.get("lock.test_child_lock")
 
 
+async def test_options_change_keeps_device(hass):
+    """Test that changing entity options does not recreate the device."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=7,
+        title="test",
+        data={
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_TYPE: "kogan_kahtp_heater",
+        },
+        options={
+            CONF_CLIMATE: True,
+            "lock_child_lock": True,
+        },
+    )
+    entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    device = hass.data[DOMAIN]["deviceid"]["device"]
+    climate = hass.data[DOMAIN]["deviceid"][CONF_CLIMATE]
+
+    hass.config_entries.async_update_entry(
+        entry,
+        options={CONF_CLIMATE: True, "lock_child_lock": False},
+    )
+    await hass.async_block_till_done()
+
+    assert hass.data[DOMAIN]["deviceid"]["device"] is device
+    assert hass.data[DOMAIN]["deviceid"][CONF_CLIMATE] is climate
+    assert "lock_child_lock" not in hass.data[DOMAIN]["deviceid"]
+    assert hass.states.get("climate.test")
+    assert hass.states.get("lock.test_child_lock").attributes.get("restored")
+
+    hass.config_entries.async_update_entry(
+        entry,
+        options={CONF_CLIMATE: True, "lock_child_lock": True, CONF_HOST: "other"},
+    )
+    await hass.async_block_till_done()
+
+    assert hass.data[DOMAIN]["deviceid"]["device"] is not device
+    assert "lock_child_lock" in hass.data[DOMAIN]["deviceid"]
+    assert len(entry.update_listeners) == 1
+
+
+async def test_fast_refresh_follows_enabled_entities(hass):
+    """Test that metering dps are only fast refreshed when enabled."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=7,
+        title="test",
+        data={
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_TYPE: "smartplugv2_energy",
+        },
+        options={CONF_SWITCH: True, "sensor_power": True},
+    )
+    entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    assert "remove_fast_refresh" in hass.data[DOMAIN]["deviceid"]
+
+    hass.config_entries.async_update_entry(
+        entry, options={CONF_SWITCH: True, "sensor_power": False}
+    )
+    await hass.async_block_till_done()
+    assert "remove_fast_refresh" not in hass.data[DOMAIN]["deviceid"]
+
+
+async def test_device_is_polled_once_for_all_entities(hass):
+    """Test that the device is polled for its entities, not by them."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=7,
+        title="test",
+        data={
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_TYPE: "kogan_kahtp_heater",
+        },
+        options={CONF_CLIMATE: True, CONF_LOCK: True},
+    )
+    entry.add_to_hass(hass)
+    with patch("custom_components.tuya_local.async_track_time_interval") as mock_track:
+        mock_track.side_effect = lambda *args: MagicMock()
+        await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+
+    data = hass.data[DOMAIN]["deviceid"]
+    polls = [c[0][1] for c in mock_track.call_args_list if c[0][2] == SCAN_INTERVAL]
+    assert len(polls) == 1
+    poll = polls[0]
+    data["device"].async_refresh = AsyncMock()
+    await poll(None)
+    data["device"].async_refresh.assert_awaited_once_with()
+
+    remove = data["remove_poll"]
+    await hass.config_entries.async_unload(entry.entry_id)
+    remove.assert_called_once()
+
+
+async def test_reloaded_config_rebuilds_entities(hass):
+    """Test that a changed device config rebuilds entities, not the device."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=7,
+        title="test",
+        data={
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_TYPE: "kogan_kahtp_heater",
+        },
+        options={
+            CONF_CLIMATE: True,
+            "lock_child_lock": True,
+        },
+    )
+    entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    device = hass.data[DOMAIN]["deviceid"]["device"]
+    climate = hass.data[DOMAIN]["deviceid"][CONF_CLIMATE]
+
+    def reparse_config():
+        device_config._CONFIGS.pop("kogan_kahtp_heater.yaml")
+        return {"kogan_kahtp_heater"}
+
+    with patch(
+        "custom_components.tuya_local.reload_configs", side_effect=reparse_config
+    ):
+        await hass.services.async_call(DOMAIN, "reload_configs", blocking=True)
+        await hass.async_block_till_done()
+
+    assert hass.data[DOMAIN]["deviceid"]["device"] is device
+    assert hass.data[DOMAIN]["deviceid"][CONF_CLIMATE] is not climate
+    assert hass.states.get("climate.test")
+    assert hass.states.get("lock.test_child_lock")
+
+    await hass.config_entries.async_unload(entry.entry_id)
+    assert "tuya_local_config_watch" not in hass.data
+
+
 @patch("custom_components.tuya_local.setup_device")
 async def test_migrate_entry(mock_setup, hass):
     """Test migration from old entry format."""
@@ -253,6 +404,7 @@ async def test_async_test_connection_valid(mock_device, hass):
         hass,
     )
     assert device == mock_instance
+    mock_instance.async_refresh.assert_awaited_once_with(wait=True)
 
 
 @patch("custom_components.tuya_local.config_flow.TuyaLocalDevice")
@@ -292,10 +444,8 @@ def setup_device_mock(mock, failure=False, type="test"):
     mock_type = MagicMock()
     mock_type.legacy_type = type
     mock_type.config_type = type
-    mock_type.match_quality.return_value = 100
-    mock_iter = MagicMock()
-    mock_iter.__aiter__.return_value = [mock_type] if not failure else []
-    mock.async_possible_types = MagicMock(return_value=mock_iter)
+    match = ConfigMatch(mock_type, 100, {})
+    mock.async_ranked_types = AsyncMock(return_value=[match] if not failure else [])
 
 
 @patch("custom_components.tuya_local.config_flow.async_test_connection")
@@ -458,6 +608,65 @@ async def test_flow_choose_entities_creates_config_entry(hass, bypass_setup):
         assert expected == result
 
 
+async def test_flow_import_creates_config_entry(hass, bypass_setup):
+    """Test a scanned device can be imported without the user steps."""
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN,
+        context={"source": "import"},
+        data={
+            CONF_NAME: "test",
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_TYPE: "kogan_kahtp_heater",
+            CONF_CLIMATE: True,
+        },
+    )
+    assert result["type"] == "create_entry"
+    assert result["title"] == "test"
+    assert result["data"] == {
+        CONF_DEVICE_ID: "deviceid",
+        CONF_HOST: "hostname",
+        CONF_LOCAL_KEY: "localkey",
+        CONF_TYPE: "kogan_kahtp_heater",
+        CONF_CLIMATE: True,
+    }
+
+
+async def test_devices_in_configuration_yaml_are_imported(hass, bypass_setup):
+    """Test devices listed in configuration.yaml are imported once."""
+    MockConfigEntry(
+        domain=DOMAIN,
+        version=7,
+        title="existing",
+        unique_id="existing",
+        data={CONF_DEVICE_ID: "existing"},
+    ).add_to_hass(hass)
+    device = {
+        CONF_NAME: "test",
+        CONF_HOST: "hostname",
+        CONF_LOCAL_KEY: "localkey",
+        CONF_TYPE: "kogan_kahtp_heater",
+        CONF_CLIMATE: True,
+    }
+    config = {
+        DOMAIN: {
+            "devices": [
+                {**device, CONF_DEVICE_ID: "deviceid"},
+                {**device, CONF_DEVICE_ID: "existing"},
+            ]
+        }
+    }
+    assert await async_setup_component(hass, DOMAIN, config)
+    await hass.async_block_till_done()
+
+    entries = {e.unique_id: e for e in hass.config_entries.async_entries(DOMAIN)}
+    assert entries.keys() == {"deviceid", "existing"}
+    assert entries["deviceid"].title == "test"
+    assert entries["deviceid"].data[CONF_CLIMATE] is True
+    assert entries["existing"].title == "existing"
+
+
 async def test_options_flow_init(hass):
     """Test config flow options."""
     config_entry = MockConfigEntry(
@@ -1,12 +1,19 @@
+import asyncio
 import tinytuya
 from datetime import datetime
-from time import sleep, time
+from time import time
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import AsyncMock, call, patch
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 from homeassistant.const import TEMP_CELSIUS
 
 from custom_components.tuya_local.device import TuyaLocalDevice
+from custom_components.tuya_local.helpers.command_queue import (
+    PRIORITY_CONFIRM,
+    PRIORITY_POLL,
+    PRIORITY_WRITE,
+    CommandCancelled,
+)
 
 from .const import (
     EUROM_600_HEATER_PAYLOAD,
@@ -18,6 +25,7 @@ class TestDevice(IsolatedAsyncioTestCase):
         device_patcher = patch("tinytuya.Device")
         self.addCleanup(device_patcher.stop)
         self.mock_api = device_patcher.start()
+        self.mock_api.return_value.status.return_value = {"dps": {}}
 
         hass_patcher = patch("homeassistant.core.HomeAssistant")
         self.addCleanup(hass_patcher.stop)
@@ -69,48 +77,67 @@ class TestDevice(IsolatedAsyncioTestCase):
 
         await self.subject.async_inferred_type()
 
-        self.subject.async_refresh.assert_awaited()
+        self.subject.async_refresh.assert_awaited_once_with(wait=True)
 
     async def test_detection_returns_none_when_device_type_could_not_be_detected(self):
         self.subject._cached_state = {"2": False, "updated_at": datetime.now()}
         self.assertEqual(await self.subject.async_inferred_type(), None)
 
     async def test_does_not_refresh_more_often_than_cache_timeout(self):
-        refresh_task = AsyncMock()
-        self.subject._cached_state = {"updated_at": time() - 19}
-        self.subject._refresh_task = awaitable = refresh_task()
+        self.subject._cached_state = {"1": True, "updated_at": time() - 19}
 
         await self.subject.async_refresh()
 
-        refresh_task.assert_awaited()
-        self.assertIs(self.subject._refresh_task, awaitable)
+        self.subject._hass.async_add_executor_job.assert_not_called()
 
-    async def test_refreshes_when_there_is_no_pending_reset(self):
-        async_job = AsyncMock()
-        self.subject._cached_state = {"updated_at": time() - 19}
-        self.subject._hass.async_add_executor_job.return_value = awaitable = async_job()
+    async def test_stale_state_is_revalidated_in_the_background(self):
+        self.subject._cached_state = {"1": True, "updated_at": time() - 20}
+        refresh = asyncio.get_running_loop().create_future()
+        self.subject._hass.async_add_executor_job.return_value = refresh
 
         await self.subject.async_refresh()
 
         self.subject._hass.async_add_executor_job.assert_called_once_with(
             self.subject.refresh
         )
-        self.assertIs(self.subject._refresh_task, awaitable)
-        async_job.assert_awaited()
+        self.assertIs(self.subject._refresh_task, refresh)
+        self.assertFalse(refresh.done())
+        refresh.cancel()
 
-    async def test_refreshes_when_there_is_expired_pending_reset(self):
-        async_job = AsyncMock()
-        self.subject._cached_state = {"updated_at": time() - 20}
-        self.subject._hass.async_add_executor_job.return_value = awaitable = async_job()
-        self.subject._refresh_task = {}
+    async def test_refresh_in_progress_is_shared(self):
+        self.subject._cached_state = {"1": True, "updated_at": 0}
+        refresh = asyncio.get_running_loop().create_future()
+        self.subject._refresh_task = refresh
 
         await self.subject.async_refresh()
 
-        self.subject._hass.async_add_executor_job.assert_called_once_with(
-            self.subject.refresh
-        )
-        self.assertIs(self.subject._refresh_task, awaitable)
-        async_job.assert_awaited()
+        self.subject._hass.async_add_executor_job.assert_not_called()
+        self.assertIs(self.subject._refresh_task, refresh)
+        refresh.cancel()
+
+    async def test_does_not_wait_for_refresh_when_there_is_no_state(self):
+        refresh = asyncio.get_running_loop().create_future()
+        self.subject._hass.async_add_executor_job.return_value = refresh
+
+        await self.subject.async_refresh()
+
+        self.assertIs(self.subject._refresh_task, refresh)
+        self.assertFalse(refresh.done())
+        refresh.cancel()
+
+    async def test_waits_for_refresh_when_asked(self):
+        refresh = asyncio.get_running_loop().create_future()
+        self.subject._hass.async_add_executor_job.return_value = refresh
+
+        def complete():
+            self.subject._cached_state = {"1": True, "updated_at": time()}
+            refresh.set_result(None)
+
+        asyncio.get_running_loop().call_soon(complete)
+        await self.subject.async_refresh(wait=True)
+
+        self.assertTrue(refresh.done())
+        self.assertTrue(self.subject.has_returned_state)
 
     def test_refresh_reloads_status_from_device(self):
         self.subject._api.status.return_value = {"dps": {"1": False}}
@@ -124,6 +151,102 @@ class TestDevice(IsolatedAsyncioTestCase):
             time() - 1 <= self.subject._cached_state["updated_at"] <= time()
         )
 
+    def test_refresh_notifies_listeners_of_changed_dps(self):
+        self.subject._api.status.return_value = {"dps": {"1": False, "2": 3}}
+        self.subject._cached_state = {"1": True, "2": 3, "updated_at": 0}
+        all_changes = MagicMock()
+        one_changes = MagicMock()
+        two_changes = MagicMock()
+        self.subject.add_listener(all_changes)
+        self.subject.add_listener(one_changes, ["1"])
+        self.subject.add_listener(two_changes, ["2"])
+
+        self.subject.refresh()
+
+        all_changes.assert_called_once_with({"1": (True, False)})
+        one_changes.assert_called_once_with({"1": (True, False)})
+        two_changes.assert_not_called()
+
+    def test_removed_listener_is_not_notified(self):
+        self.subject._api.status.return_value = {"dps": {"1": False}}
+        self.subject._cached_state = {"1": True}
+        listener = MagicMock()
+        remove = self.subject.add_listener(listener)
+        remove()
+
+        self.subject.refresh()
+
+        listener.assert_not_called()
+
+    def test_reset_notifies_listeners_of_lost_dps(self):
+        self.subject._cached_state = {"1": True, "updated_at": time()}
+        listener = MagicMock()
+        self.subject.add_listener(listener)
+
+        self.subject._reset_cached_state()
+
+        listener.assert_called_once_with({"1": (True, None)})
+
+    def test_refresh_dps_requests_targeted_update(self):
+        self.subject._cached_state = {"1": True, "19": 10, "updated_at": 5}
+        self.subject._api.updatedps.return_value = None
+        self.subject._api.receive.return_value = {"dps": {"1": False, "19": 20}}
+        changes = MagicMock()
+        self.subject.add_listener(changes)
+
+        self.subject.refresh_dps(["18", "19"])
+
+        self.subject._api.updatedps.assert_called_once_with([18, 19])
+        self.subject._api.status.assert_not_called()
+        self.assertEqual(
+            self.subject._cached_state, {"1": True, "19": 20, "updated_at": 5}
+        )
+        changes.assert_called_once_with({"19": (10, 20)})
+
+    def test_refresh_dps_uses_values_returned_with_the_request(self):
+        self.subject._cached_state = {"1": True, "19": 10, "updated_at": 5}
+        self.subject._api.updatedps.return_value = {"dps": {"19": 20}}
+
+        self.subject.refresh_dps(["19"])
+
+        self.subject._api.receive.assert_not_called()
+        self.subject._api.status.assert_not_called()
+        self.assertEqual(self.subject._cached_state["19"], 20)
+
+    def test_refresh_dps_keeps_connection_open_for_pushed_status(self):
+        self.subject._cached_state = {"1": True, "19": 10, "updated_at": 5}
+        self.subject._api.updatedps.return_value = None
+        self.subject._api.receive.return_value = None
+
+        self.subject.refresh_dps(["19"])
+
+        self.subject._api.set_socketPersistent.assert_has_calls(
+            [call(True), call(False)]
+        )
+        self.subject._api.close.assert_called_once()
+        self.assertEqual(self.subject._cached_state["19"], 10)
+
+    def test_refresh_dps_ignores_error_replies(self):
+        self.subject._cached_state = {"1": True, "19": 10, "updated_at": 5}
+        self.subject._api.updatedps.return_value = {"Error": "Timeout"}
+        self.subject._api.receive.return_value = {"Error": "Timeout"}
+
+        self.subject.refresh_dps(["19"])
+
+        self.assertEqual(
+            self.subject._cached_state, {"1": True, "19": 10, "updated_at": 5}
+        )
+
+    def test_refresh_dps_waits_for_full_state(self):
+        self.subject.refresh_dps(["19"])
+        self.subject._api.updatedps.assert_not_called()
+
+    def test_refresh_dps_ignores_failures(self):
+        self.subject._cached_state = {"1": True, "updated_at": 5}
+        self.subject._api.updatedps.side_effect = Exception("Error")
+        self.subject.refresh_dps(["19"])
+        self.assertEqual(self.subject._cached_state, {"1": True, "updated_at": 5})
+
     def test_refresh_retries_up_to_four_times(self):
         self.subject._api.status.side_effect = [
             Exception("Error"),
@@ -199,6 +322,39 @@ class TestDevice(IsolatedAsyncioTestCase):
         self.assertEqual(self.subject._cached_state, {"updated_at": 0})
         self.assertEqual(self.subject._pending_updates, {})
 
+    def test_restore_state_seeds_stale_cached_state(self):
+        self.subject.restore_state({"1": True})
+
+        self.assertTrue(self.subject.has_returned_state)
+        self.assertEqual(self.subject.get_property("1"), True)
+        self.assertEqual(self.subject._cached_state["updated_at"], 0)
+
+    def test_restore_state_does_not_override_returned_state(self):
+        self.subject._cached_state = {"1": False, "updated_at": time()}
+        self.subject.restore_state({"1": True})
+        self.assertEqual(self.subject.get_property("1"), False)
+
+    def test_wire_format_is_learned_from_first_status(self):
+        self.subject._api.status.return_value = {"dps": {"1": "5", "2": 3}}
+        self.subject.refresh()
+        self.assertTrue(self.subject.is_stringified("1"))
+        self.assertFalse(self.subject.is_stringified("2"))
+        self.assertFalse(self.subject.is_stringified("3"))
+
+        self.subject._api.status.return_value = {"dps": {"1": 6, "2": 3, "3": "x"}}
+        self.subject.refresh()
+        self.assertTrue(self.subject.is_stringified("1"))
+        self.assertTrue(self.subject.is_stringified("3"))
+
+    def test_restore_state_seeds_wire_format(self):
+        self.subject.restore_state({"1": "5"})
+        self.assertTrue(self.subject.is_stringified("1"))
+
+    def test_snapshot_excludes_pending_updates(self):
+        self.subject._cached_state = {"1": True, "updated_at": 5}
+        self.subject._pending_updates = {"1": {"value": False, "updated_at": time()}}
+        self.assertEqual(self.subject.snapshot(), {"1": True, "updated_at": 5})
+
     def test_get_property_returns_value_from_cached_state(self):
         self.subject._cached_state = {"1": True}
         self.assertEqual(self.subject.get_property("1"), True)
@@ -241,23 +397,20 @@ class TestDevice(IsolatedAsyncioTestCase):
         async_job.assert_awaited()
 
     def test_set_property_immediately_stores_new_value_to_pending_updates(self):
-        self.subject.set_property("1", False)
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", False)
         self.subject._cached_state = {"1": True}
         self.assertEqual(self.subject.get_property("1"), False)
-        # wait for the debounce timer to avoid a teardown error
-        sleep(2)
 
-    def test_debounces_multiple_set_calls_into_one_api_call(self):
+    def test_coalesces_multiple_set_calls_into_one_api_call(self):
         with patch("custom_components.tuya_local.device.Timer") as mock:
             self.subject.set_property("1", True)
-            mock.assert_called_once_with(1, self.subject._send_pending_updates)
-
-            debounce = self.subject._debounce
+            mock.assert_called_once_with(0.5, self.subject._send_pending_updates)
             mock.reset_mock()
 
+            self.subject.set_property("2", True)
             self.subject.set_property("2", False)
-            debounce.cancel.assert_called_once()
-            mock.assert_called_once_with(1, self.subject._send_pending_updates)
+            mock.assert_not_called()
 
             self.subject._api.generate_payload.return_value = "payload"
             self.subject._send_pending_updates()
@@ -266,6 +419,146 @@ class TestDevice(IsolatedAsyncioTestCase):
             )
             self.subject._api._send_receive.assert_called_once_with("payload")
 
+    def test_only_unsent_updates_are_sent(self):
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", True)
+            self.subject._send_pending_updates()
+            self.subject._api.generate_payload.reset_mock()
+
+            self.subject.set_property("2", False)
+            self.subject._send_pending_updates()
+            self.subject._api.generate_payload.assert_called_once_with(
+                tinytuya.CONTROL, {"2": False}
+            )
+            self.assertEqual(self.subject.get_property("1"), True)
+
+    def test_nothing_is_sent_when_updates_were_already_sent(self):
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", True)
+            self.subject._send_pending_updates()
+            self.subject._api._send_receive.reset_mock()
+
+            self.subject._send_pending_updates()
+            self.subject._api._send_receive.assert_not_called()
+
+    def test_writes_matching_confirmed_state_are_skipped(self):
+        self.subject._api.status.return_value = {"dps": {"1": True, "2": 3}}
+        self.subject.refresh()
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", True)
+            self.subject.set_property("2", 4)
+            self.subject._api.status.return_value = {"dps": {"1": True, "2": 4}}
+            self.subject._send_pending_updates()
+            self.subject._api.generate_payload.assert_called_once_with(
+                tinytuya.CONTROL, {"2": 4}
+            )
+
+            self.subject._api.generate_payload.reset_mock()
+            self.subject.set_property("2", 3)
+            self.subject._send_pending_updates()
+            self.subject._api.generate_payload.assert_called_once_with(
+                tinytuya.CONTROL, {"2": 3}
+            )
+
+    def test_no_update_is_sent_when_all_writes_match_confirmed_state(self):
+        self.subject._api.status.return_value = {"dps": {"1": True}}
+        self.subject.refresh()
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", True)
+            self.subject._send_pending_updates()
+            self.subject._api._send_receive.assert_not_called()
+
+    def test_writes_are_not_skipped_against_stale_state(self):
+        self.subject._api.status.return_value = {"dps": {"1": True}}
+        self.subject.refresh()
+        self.subject._confirmed_state["updated_at"] = time() - 30
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", True)
+            self.subject._send_pending_updates()
+            self.subject._api.generate_payload.assert_called_once_with(
+                tinytuya.CONTROL, {"1": True}
+            )
+
+    def test_anticipated_values_are_not_treated_as_confirmed(self):
+        self.subject._api.status.return_value = {"dps": {"1": True}}
+        self.subject.refresh()
+        self.subject.anticipate_property_value("1", False)
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", False)
+            self.subject._send_pending_updates()
+            self.subject._api.generate_payload.assert_called_once_with(
+                tinytuya.CONTROL, {"1": False}
+            )
+
+    def test_write_is_confirmed_at_higher_priority_than_polls(self):
+        self.subject._api.status.return_value = {"dps": {"1": True}}
+        with patch.object(self.subject, "_commands") as mock_queue, patch(
+            "custom_components.tuya_local.device.Timer"
+        ):
+            mock_queue.run.side_effect = lambda priority, func: func()
+            self.subject.set_property("1", True)
+            self.subject._send_pending_updates()
+            self.subject.refresh()
+        self.assertEqual(
+            [c.args[0] for c in mock_queue.run.call_args_list],
+            [PRIORITY_WRITE, PRIORITY_CONFIRM, PRIORITY_POLL],
+        )
+        self.assertEqual(self.subject._api.status.call_count, 2)
+
+    def test_failed_write_is_not_confirmed(self):
+        self.subject._api._send_receive.side_effect = OSError("timed out")
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", True)
+            self.subject._send_pending_updates()
+        self.subject._api.status.assert_not_called()
+
+    def test_cancelled_refresh_keeps_state(self):
+        self.subject._cached_state = {"1": True, "updated_at": 5}
+        with patch.object(self.subject, "_commands") as mock_queue:
+            mock_queue.run.side_effect = CommandCancelled()
+            self.subject.refresh()
+            mock_queue.run.assert_called_once()
+        self.assertEqual(self.subject._cached_state, {"1": True, "updated_at": 5})
+
+    def test_writes_are_rate_limited(self):
+        with patch("custom_components.tuya_local.device.Timer") as mock, patch(
+            "custom_components.tuya_local.device.monotonic"
+        ) as mock_time:
+            mock_time.return_value = self.subject._write_tokens_at
+            for value in [True, False]:
+                self.subject.set_property("1", value)
+                self.subject._send_pending_updates()
+            self.assertEqual(self.subject._api._send_receive.call_count, 2)
+
+            mock.reset_mock()
+            self.subject.set_property("1", True)
+            mock.assert_called_once_with(1.0, self.subject._send_pending_updates)
+
+            # Firing before a token is earned waits for it instead of sending
+            mock.reset_mock()
+            self.subject._send_pending_updates()
+            self.assertEqual(self.subject._api._send_receive.call_count, 2)
+            self.assertEqual(self.subject._write_tokens, 0)
+            mock.assert_called_once_with(1.0, self.subject._send_pending_updates)
+
+            mock_time.return_value += 1
+            self.subject._send_pending_updates()
+            self.assertEqual(self.subject._api._send_receive.call_count, 3)
+            self.assertEqual(self.subject._write_tokens, 0)
+
+    def test_stop_cancels_scheduled_write(self):
+        with patch("custom_components.tuya_local.device.Timer") as mock:
+            self.subject.set_property("1", True)
+            self.subject.stop()
+            mock.return_value.cancel.assert_called_once()
+            self.assertIsNone(self.subject._write_timer)
+
+    def test_unsent_updates_do_not_expire(self):
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", True)
+            self.subject._pending_updates["1"]["updated_at"] = time() - 20
+            self.assertEqual(self.subject.get_property("1"), True)
+
     def test_set_properties_takes_no_action_when_no_properties_are_provided(self):
         with patch("custom_components.tuya_local.device.Timer") as mock:
             self.subject._set_properties({})
@@ -276,6 +569,41 @@ class TestDevice(IsolatedAsyncioTestCase):
         self.subject.anticipate_property_value("1", False)
         self.assertEqual(self.subject._cached_state["1"], False)
 
+    def test_set_property_publishes_pending_value(self):
+        self.subject._cached_state = {"1": False, "updated_at": time()}
+        changes = MagicMock()
+        reported = MagicMock()
+        self.subject.add_listener(changes)
+        self.subject.add_listener(reported, pending=False)
+        with patch("custom_components.tuya_local.device.Timer"):
+            self.subject.set_property("1", True)
+        changes.assert_called_once_with({"1": (False, True)})
+        reported.assert_not_called()
+
+    def test_anticipated_value_is_published(self):
+        self.subject._cached_state = {"1": False, "updated_at": time()}
+        changes = MagicMock()
+        self.subject.add_listener(changes)
+        self.subject.anticipate_property_value("1", True)
+        changes.assert_called_once_with({"1": (False, True)})
+
+    def test_expired_pending_value_publishes_reported_value(self):
+        self.subject._api.status.return_value = {"dps": {"1": False}}
+        changes = MagicMock()
+        self.subject.add_listener(changes)
+        with patch("custom_components.tuya_local.device.Timer") as mock:
+            self.subject.set_property("1", True)
+            self.subject._send_pending_updates()
+            mock.assert_called_with(10, self.subject._expire_pending_updates)
+        # The device has not applied the write, but the pending value shows
+        self.assertEqual(self.subject.get_property("1"), True)
+        changes.reset_mock()
+
+        self.subject._pending_updates["1"]["updated_at"] = time() - 10
+        self.subject._expire_pending_updates()
+        changes.assert_called_once_with({"1": (True, False)})
+        self.assertEqual(self.subject.get_property("1"), False)
+
     def test_get_key_for_value_returns_key_from_object_matching_value(self):
         obj = {"key1": "value1", "key2": "value2"}
 
@@ -1,17 +1,30 @@
 """Test the config parser"""
+from os import remove, utime
+from os.path import dirname, join
+from shutil import copy
+from tempfile import TemporaryDirectory
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from warnings import warn
 
+from custom_components.tuya_local.helpers.config_schema import compile_config
 from custom_components.tuya_local.helpers.device_config import (
     available_configs,
     get_config,
     possible_matches,
+    rank_matches,
+    reload_configs,
+    set_user_config_dir,
     TuyaDeviceConfig,
+    TuyaEntityConfig,
 )
 
+import custom_components.tuya_local.devices as config_dir
+import custom_components.tuya_local.helpers.device_config as device_config
+
 from .const import (
+    BECA_BHP6000_PAYLOAD,
     DEHUMIDIFIER_PAYLOAD,
     GPPH_HEATER_PAYLOAD,
     KOGAN_HEATER_PAYLOAD,
@@ -46,6 +59,40 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
             self.assertIsNotNone(parsed.legacy_type)
             self.assertIsNotNone(parsed.primary_entity)
 
+    def test_config_files_are_frozen_with_defaults(self):
+        """Test that compiled configs have defaults and cannot be modified."""
+        cfg = get_config("goldair_gpph_heater")
+        dps = cfg.primary_entity.find_dps("hvac_mode")
+        self.assertEqual(dps.id, "1")
+        self.assertFalse(dps.readonly)
+        self.assertEqual(dps._mapping[0]["scale"], 1)
+        with self.assertRaises(TypeError):
+            dps._config["readonly"] = True
+
+    def test_malformed_config_is_rejected(self):
+        """Test that invalid configs are rejected with the file named."""
+        config = {
+            "name": "Broken",
+            "primary_entity": {
+                "entity": "switch",
+                "dps": [
+                    {
+                        "id": 1,
+                        "name": "switch",
+                        "type": "boolean",
+                        "mapping": [{"scale": "ten"}],
+                    }
+                ],
+            },
+        }
+        with self.assertRaisesRegex(ValueError, "broken.yaml"):
+            compile_config(config, "broken.yaml")
+
+        config["primary_entity"]["dps"][0]["mapping"] = []
+        config["primary_entity"]["dps"][0]["type"] = "complex"
+        with self.assertRaisesRegex(ValueError, "broken.yaml"):
+            compile_config(config, "broken.yaml")
+
     # Most of the device_config functionality is exercised during testing of
     # the various supported devices.  These tests concentrate only on the gaps.
 
@@ -57,6 +104,201 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
         q = cfg.match_quality({**GPPH_HEATER_PAYLOAD})
         self.assertEqual(q, 0)
 
+    def test_match_explains_each_dps(self):
+        """Test that match reports why each dps did or did not match."""
+        cfg = get_config("goldair_gpph_heater")
+        quality, explanation = cfg.match({**GPPH_HEATER_PAYLOAD, "200": 1})
+        self.assertEqual(quality, round(len(GPPH_HEATER_PAYLOAD) * 100 / 13))
+        self.assertEqual(explanation["1"], "matched")
+        self.assertEqual(explanation["200"], "unused")
+
+        payload = {**GPPH_HEATER_PAYLOAD, "2": "hot"}
+        del payload["1"]
+        quality, explanation = cfg.match(payload)
+        self.assertEqual(quality, 0)
+        self.assertEqual(explanation["1"], "missing")
+        self.assertEqual(explanation["2"], "not int")
+
+    def test_rank_matches_returns_unique_perfect_match_alone(self):
+        """Test that a unique perfect match stops the search."""
+        ranked = rank_matches({**GPPH_HEATER_PAYLOAD, "updated_at": 0})
+        self.assertEqual(len(ranked), 1)
+        self.assertEqual(ranked[0].config.config_type, "goldair_gpph_heater")
+        self.assertEqual(ranked[0].quality, 100)
+
+    def test_rank_matches_ranks_all_when_ambiguous(self):
+        """Test that all matches are ranked when no match is unique."""
+        ranked = rank_matches(BECA_BHP6000_PAYLOAD)
+        self.assertEqual(
+            [m.config.config_type for m in ranked if m.quality == 100],
+            ["beca_bhp6000_thermostat_c", "beca_bhp6000_thermostat_f"],
+        )
+        qualities = [m.quality for m in ranked]
+        self.assertEqual(qualities, sorted(qualities, reverse=True))
+        expected = {c.config_type for c in possible_matches(BECA_BHP6000_PAYLOAD)}
+        self.assertEqual({m.config.config_type for m in ranked}, expected)
+
+    def test_reload_configs_updates_only_changed_files(self):
+        """Test that reloading reparses only changed, added or removed files."""
+        bundled = dirname(config_dir.__file__)
+        with TemporaryDirectory() as tmp, patch.multiple(
+            device_config,
+            config_dir=MagicMock(__file__=join(tmp, "__init__.py")),
+            _CONFIGS={},
+            _VERSIONS={},
+            _FAILED={},
+            _FILES=None,
+            _INDEX=None,
+        ):
+            for fname in ("smartplugv1.yaml", "goldair_gpph_heater.yaml"):
+                copy(join(bundled, fname), tmp)
+            switch = get_config("smartplugv1")
+            heater = get_config("goldair_gpph_heater")
+            self.assertEqual(len(rank_matches(GPPH_HEATER_PAYLOAD)), 1)
+            self.assertEqual(reload_configs(), set())
+
+            index = device_config._INDEX
+            snapshot = {ids: list(bucket) for ids, bucket in index.items()}
+            utime(join(tmp, "smartplugv1.yaml"), (0, 0))
+            self.assertEqual(reload_configs(), {"smartplugv1"})
+            self.assertIsNot(get_config("smartplugv1"), switch)
+            # The previous index is replaced, not modified under readers
+            self.assertIsNot(device_config._INDEX, index)
+            self.assertEqual(index, snapshot)
+            self.assertIs(get_config("goldair_gpph_heater"), heater)
+
+            copy(join(bundled, "kogan_kahtp_heater.yaml"), tmp)
+            self.assertEqual(reload_configs(), set())
+            ranked = rank_matches(KOGAN_HEATER_PAYLOAD)
+            self.assertEqual(ranked[0].config.config_type, "kogan_kahtp_heater")
+
+            with open(join(tmp, "goldair_gpph_heater.yaml"), "w") as f:
+                f.write("name: broken\n")
+            self.assertEqual(reload_configs(), set())
+            self.assertIs(get_config("goldair_gpph_heater"), heater)
+
+            remove(join(tmp, "goldair_gpph_heater.yaml"))
+            self.assertEqual(reload_configs(), {"goldair_gpph_heater"})
+            self.assertNotIn(
+                heater, [m.config for m in rank_matches(GPPH_HEATER_PAYLOAD)]
+            )
+            self.assertCountEqual(
+                available_configs(), ["smartplugv1.yaml", "kogan_kahtp_heater.yaml"]
+            )
+
+    def test_user_configs_are_merged_with_bundled(self):
+        """Test that user configs are added, and replace bundled ones."""
+        bundled = dirname(config_dir.__file__)
+        with TemporaryDirectory() as tmp, patch.multiple(
+            device_config,
+            _CONFIGS={},
+            _VERSIONS={},
+            _FAILED={},
+            _FILES=None,
+            _INDEX=None,
+            _USER_DIR=None,
+        ):
+            bundled_heater = get_config("goldair_gpph_heater")
+            with open(join(bundled, "goldair_gpph_heater.yaml")) as f:
+                heater = f.read()
+            with open(join(tmp, "goldair_gpph_heater.yaml"), "w") as f:
+                f.write(heater.replace("name: Goldair GPPH Heater", "name: Mine"))
+            with open(join(tmp, "my_heater.yaml"), "w") as f:
+                f.write(heater.replace("name: Goldair GPPH Heater", "name: New"))
+            with open(join(tmp, "broken.yaml"), "w") as f:
+                f.write("name: broken\n")
+
+            set_user_config_dir(tmp)
+            self.assertEqual(reload_configs(), {"goldair_gpph_heater"})
+
+            files = list(available_configs())
+            self.assertEqual(files, sorted(files))
+            self.assertIn("my_heater.yaml", files)
+            self.assertIn("smartplugv1.yaml", files)
+            self.assertEqual(files.count("goldair_gpph_heater.yaml"), 1)
+
+            self.assertIsNot(get_config("goldair_gpph_heater"), bundled_heater)
+            self.assertEqual(get_config("goldair_gpph_heater").name, "Mine")
+            self.assertEqual(get_config("my_heater").name, "New")
+            self.assertEqual(
+                [
+                    m.config.name
+                    for m in rank_matches(GPPH_HEATER_PAYLOAD)
+                    if m.quality == 100
+                ],
+                ["Mine", "New"],
+            )
+
+    def test_malformed_yaml_user_config_is_skipped(self):
+        """Test that a user config with a YAML syntax error is skipped."""
+        with TemporaryDirectory() as tmp, patch.multiple(
+            device_config,
+            _CONFIGS={},
+            _VERSIONS={},
+            _FAILED={},
+            _FILES=None,
+            _INDEX=None,
+            _USER_DIR=None,
+        ):
+            with open(join(tmp, "broken.yaml"), "w") as f:
+                f.write("name: broken\nprimary_entity: [\n")
+            self.assertTrue(rank_matches(GPPH_HEATER_PAYLOAD))
+
+            set_user_config_dir(tmp)
+            with self.assertLogs(device_config._LOGGER, "ERROR") as logs:
+                self.assertEqual(reload_configs(), set())
+                self.assertIn("broken.yaml", list(available_configs()))
+                ranked = rank_matches(GPPH_HEATER_PAYLOAD)
+                self.assertEqual(ranked[0].config.config_type, "goldair_gpph_heater")
+
+                device_config._INDEX = None
+                ranked = rank_matches(GPPH_HEATER_PAYLOAD)
+                self.assertEqual(ranked[0].config.config_type, "goldair_gpph_heater")
+                self.assertEqual(reload_configs(), set())
+            self.assertEqual(len(logs.records), 1)
+
+            utime(join(tmp, "broken.yaml"), (0, 0))
+            with self.assertLogs(device_config._LOGGER, "ERROR") as logs:
+                self.assertEqual(reload_configs(), set())
+                rank_matches(GPPH_HEATER_PAYLOAD)
+            self.assertEqual(len(logs.records), 1)
+
+    def test_icon_lookup_matches_rules(self):
+        """Test that icons looked up by value match evaluating every rule."""
+        for cfg in available_configs():
+            parsed = TuyaDeviceConfig(cfg)
+            for entity in parsed.all_entities():
+                candidates = {}
+                for d in entity.dps():
+                    values = [m["dps_val"] for m in d._mapping if "dps_val" in m]
+                    candidates[d.id] = values + [None]
+                for n in range(max(len(v) for v in candidates.values())):
+                    state = {i: v[n % len(v)] for i, v in candidates.items()}
+                    device = MagicMock()
+                    device.get_property.side_effect = state.get
+                    with self.subTest(cfg=cfg, entity=entity.config_id, state=state):
+                        self.assertEqual(entity.icon(device), entity._find_icon(device))
+
+    def test_icon_only_reevaluated_when_relevant_dps_change(self):
+        """Test that icons are remembered by the values of dps affecting them."""
+        cfg = get_config("goldair_gpph_heater")
+        entity = cfg.primary_entity
+        state = {**GPPH_HEATER_PAYLOAD}
+        device = MagicMock()
+        device.get_property.side_effect = state.get
+        icon = entity.icon(device)
+
+        with patch.object(entity, "_find_icon", return_value="mdi:other") as rules:
+            for i in state:
+                if i not in entity._icon_dps:
+                    state[i] = 99
+            self.assertEqual(entity.icon(device), icon)
+            rules.assert_not_called()
+
+            state[entity._icon_dps[0]] = "changed"
+            self.assertEqual(entity.icon(device), "mdi:other")
+            rules.assert_called_once()
+
     def test_entity_find_unknown_dps_fails(self):
         """Test that finding a dps that doesn't exist fails."""
         cfg = get_config("kogan_switch")
@@ -78,6 +320,129 @@ class TestDeviceConfig(IsolatedAsyncioTestCase):
         voltage = cfg.primary_entity.find_dps("voltage_v")
         self.assertIsNone(voltage.values(mock_device))
 
+    def test_dependencies_include_constraints_and_redirects(self):
+        """Test that the dependency graph follows constraints and redirects."""
+        cfg = get_config("goldair_gpph_heater")
+        climate = cfg.primary_entity
+        temperature = climate.find_dps("temperature")
+        eco_temperature = climate.find_dps("eco_temperature")
+        preset = climate.find_dps("preset_mode")
+        self.assertIn(temperature.id, temperature.dependencies)
+        self.assertIn(preset.id, temperature.dependencies)
+        self.assertIn(eco_temperature.id, temperature.dependencies)
+
+    def test_get_values_decodes_from_one_snapshot(self):
+        """Test that batch decoding reads each dps once and reuses the cache."""
+        payload = {**GPPH_HEATER_PAYLOAD, "4": "ECO", "106": 18}
+        mock_device = MagicMock()
+        mock_device.get_property.side_effect = lambda id: payload[id]
+        climate = get_config("goldair_gpph_heater").primary_entity
+        cache = {}
+
+        values = climate.get_values(mock_device, cache=cache)
+
+        self.assertEqual(values["temperature"], 18)
+        self.assertEqual(values["preset_mode"], "eco")
+        fetched = [c.args[0] for c in mock_device.get_property.call_args_list]
+        self.assertCountEqual(fetched, set(fetched))
+
+        payload["106"] = 19
+        values = climate.get_values(mock_device, cache=cache)
+        self.assertEqual(values["temperature"], 19)
+        self.assertEqual(values["eco_temperature"], 19)
+        self.assertEqual(values["preset_mode"], "eco")
+
+    def test_get_values_cache_distinguishes_value_types(self):
+        """Test that equal values of different types are decoded again."""
+        payload = {**GPPH_HEATER_PAYLOAD, "1": True}
+        mock_device = MagicMock()
+        mock_device.get_property.side_effect = lambda id: payload[id]
+        climate = get_config("goldair_gpph_heater").primary_entity
+        power = climate.find_dps("hvac_mode")
+        cache = {}
+        climate.get_values(mock_device, [power], cache)
+
+        with patch.object(power, "get_value", return_value="other") as decode:
+            climate.get_values(mock_device, [power], cache)
+            decode.assert_not_called()
+
+            payload["1"] = 1
+            values = climate.get_values(mock_device, [power], cache)
+            decode.assert_called_once()
+            self.assertEqual(values["hvac_mode"], "other")
+
+    def test_redirect_cycle_is_rejected(self):
+        """Test that redirect cycles are detected when compiling."""
+        device = MagicMock()
+        device.name = "Cyclic"
+        config = {
+            "entity": "sensor",
+            "dps": [
+                {
+                    "id": 1,
+                    "name": "a",
+                    "type": "integer",
+                    "mapping": [{"value_redirect": "b"}],
+                },
+                {
+                    "id": 2,
+                    "name": "b",
+                    "type": "integer",
+                    "mapping": [{"value_redirect": "a"}],
+                },
+            ],
+        }
+        with self.assertRaises(ValueError):
+            TuyaEntityConfig(device, config)
+
+    def test_redirect_to_unknown_dps_is_rejected(self):
+        """Test that redirects to missing dps are detected when compiling."""
+        device = MagicMock()
+        device.name = "Broken"
+        config = {
+            "entity": "sensor",
+            "dps": [
+                {
+                    "id": 1,
+                    "name": "a",
+                    "type": "integer",
+                    "mapping": [{"value_redirect": "missing"}],
+                },
+            ],
+        }
+        with self.assertRaises(ValueError):
+            TuyaEntityConfig(device, config)
+
+    def test_fast_refresh_dps(self):
+        """Test that metering dps are flagged for fast refresh."""
+        cfg = get_config("smartplugv2_energy")
+        fast = [d.id for e in cfg.all_entities() for d in e.dps() if d.fast_refresh]
+        self.assertCountEqual(fast, ["18", "19", "20"])
+
+    def test_configs_are_shared(self):
+        """Test that configs are parsed once and shared between devices."""
+        cfg = get_config("deta_fan")
+        self.assertIs(get_config("deta_fan"), cfg)
+        self.assertIs(cfg.primary_entity, cfg.primary_entity)
+        self.assertEqual(
+            [id(e) for e in cfg.secondary_entities()],
+            [id(e) for e in cfg.secondary_entities()],
+        )
+
+    def test_stringify_follows_device_wire_format(self):
+        """Test that devices sharing a config encode in their own wire format."""
+        speed = get_config("deta_fan").primary_entity.find_dps("speed")
+        stringified = MagicMock()
+        stringified.get_property.return_value = "1"
+        stringified.is_stringified.return_value = True
+        plain = MagicMock()
+        plain.get_property.return_value = 1
+        plain.is_stringified.return_value = False
+
+        self.assertEqual(speed.get_value(stringified), speed.get_value(plain))
+        self.assertEqual(speed.get_values_to_set(stringified, 66.7), {"3": "2"})
+        self.assertEqual(speed.get_values_to_set(plain, 66.7), {"3": 2})
+
     # Test detection of all devices.
 
     def _test_detect(self, payload, dev_type, legacy_class):
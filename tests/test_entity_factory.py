@@ -0,0 +1,91 @@
+"""Tests for the shared entity factory."""
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+from custom_components.tuya_local.const import CONF_DEVICE_ID, CONF_TYPE, DOMAIN
+from custom_components.tuya_local.generic.fan import TuyaLocalFan
+from custom_components.tuya_local.generic.light import TuyaLocalLight
+from custom_components.tuya_local.generic.switch import TuyaLocalSwitch
+from custom_components.tuya_local.heater.climate import GoldairHeater
+from custom_components.tuya_local.helpers.device_config import get_config
+from custom_components.tuya_local.helpers.entity_factory import (
+    async_setup_platform_entities,
+    create_entities,
+)
+
+
+def test_create_entities_groups_enabled_entities_by_platform():
+    device = MagicMock()
+    entities = create_entities(
+        device,
+        get_config("deta_fan"),
+        {"fan": True, "light": True, "switch_master": False},
+    )
+    assert set(entities) == {"fan", "light"}
+    assert type(entities["fan"]["fan"]) == TuyaLocalFan
+    assert type(entities["light"]["light"]) == TuyaLocalLight
+
+
+def test_create_entities_filters_by_platform():
+    entities = create_entities(
+        MagicMock(),
+        get_config("deta_fan"),
+        {"fan": True, "light": True, "switch_master": True},
+        "switch",
+    )
+    assert set(entities) == {"switch"}
+    assert type(entities["switch"]["switch_master"]) == TuyaLocalSwitch
+
+
+def test_create_entities_uses_legacy_class():
+    entities = create_entities(
+        MagicMock(), get_config("goldair_gpph_heater"), {"climate": True}
+    )
+    assert type(entities["climate"]["climate"]) == GoldairHeater
+
+
+def test_create_entities_parses_config_once():
+    cfg = get_config("deta_fan")
+    with patch.object(
+        type(cfg), "all_entities", wraps=cfg.all_entities, autospec=True
+    ) as m_all:
+        create_entities(
+            MagicMock(), cfg, {"fan": True, "light": True, "switch_master": True}
+        )
+        m_all.assert_called_once()
+
+
+async def test_setup_uses_prebuilt_entities(hass):
+    m_add_entities = Mock()
+    prebuilt = MagicMock()
+    hass.data[DOMAIN] = {
+        "dummy": {"device": AsyncMock(), "entities": {"fan": {"fan": prebuilt}}}
+    }
+    with patch(
+        "custom_components.tuya_local.helpers.entity_factory.get_config"
+    ) as m_get_config:
+        await async_setup_platform_entities(
+            hass,
+            "fan",
+            m_add_entities,
+            {CONF_TYPE: "deta_fan", CONF_DEVICE_ID: "dummy", "fan": True},
+        )
+        m_get_config.assert_not_called()
+
+    m_add_entities.assert_called_once_with([prebuilt])
+    assert hass.data[DOMAIN]["dummy"]["fan"] is prebuilt
+    assert "fan" not in hass.data[DOMAIN]["dummy"]["entities"]
+
+
+async def test_setup_fails_if_platform_has_no_entities(hass):
+    m_add_entities = Mock()
+    hass.data[DOMAIN] = {"dummy": {"device": AsyncMock()}}
+    with pytest.raises(ValueError):
+        await async_setup_platform_entities(
+            hass,
+            "lock",
+            m_add_entities,
+            {CONF_TYPE: "deta_fan", CONF_DEVICE_ID: "dummy", "fan": True},
+        )
+    m_add_entities.assert_not_called()
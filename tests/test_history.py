@@ -0,0 +1,135 @@
+"""Tests for the dps history and its diagnostics."""
+from unittest import TestCase
+
+import pytest
+from homeassistant.const import CONF_HOST
+from homeassistant.exceptions import HomeAssistantError
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_capture_events,
+)
+from unittest.mock import MagicMock
+
+from custom_components.tuya_local import _async_register_services
+from custom_components.tuya_local.const import (
+    CONF_DEVICE_ID,
+    CONF_LOCAL_KEY,
+    CONF_TYPE,
+    DOMAIN,
+    EVENT_HISTORY,
+    SERVICE_DUMP_HISTORY,
+)
+from custom_components.tuya_local.diagnostics import (
+    async_get_config_entry_diagnostics,
+)
+from custom_components.tuya_local.helpers.history import DpsHistory
+
+
+class TestDpsHistory(TestCase):
+    def test_records_values_of_each_type(self):
+        subject = DpsHistory(10)
+        subject.record(
+            {"1": (None, True), "2": (None, 5), "3": (None, 2.5), "4": (None, "eco")},
+            when=1,
+        )
+        subject.record({"2": (5, None)}, when=2)
+        self.assertEqual(
+            subject.entries(),
+            [
+                (1, "1", True),
+                (1, "2", 5),
+                (1, "3", 2.5),
+                (1, "4", "eco"),
+                (2, "2", None),
+            ],
+        )
+        self.assertEqual(subject.entries("2"), [(1, "2", 5), (2, "2", None)])
+
+    def test_keeps_the_most_recent_values(self):
+        subject = DpsHistory(3)
+        for n in range(5):
+            subject.record({"1": (None, n)}, when=n)
+        self.assertEqual(len(subject), 3)
+        self.assertEqual([e[2] for e in subject.entries()], [2, 3, 4])
+
+    def test_interned_strings_are_compacted(self):
+        subject = DpsHistory(2)
+        for n in range(10):
+            subject.record({"1": (None, f"value{n}")}, when=n)
+        self.assertLessEqual(len(subject._strings), 5)
+        self.assertEqual([e[2] for e in subject.entries()], ["value8", "value9"])
+
+    def test_as_dicts(self):
+        subject = DpsHistory(2)
+        subject.record({"1": (None, True)}, when=1)
+        self.assertEqual(subject.as_dicts(), [{"time": 1, "dps": "1", "value": True}])
+
+
+async def test_dump_history_fires_event(hass):
+    history = DpsHistory()
+    history.record({"1": (None, True), "2": (None, 3)}, when=1)
+    hass.data[DOMAIN] = {"deviceid": {"history": history}}
+    events = async_capture_events(hass, EVENT_HISTORY)
+    _async_register_services(hass)
+
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_DUMP_HISTORY,
+        {CONF_DEVICE_ID: "deviceid", "dps": 2},
+        blocking=True,
+    )
+    await hass.async_block_till_done()
+
+    assert len(events) == 1
+    assert events[0].data == {
+        CONF_DEVICE_ID: "deviceid",
+        "history": [{"time": 1, "dps": "2", "value": 3}],
+    }
+
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(
+            DOMAIN, SERVICE_DUMP_HISTORY, {CONF_DEVICE_ID: "unknown"}, blocking=True
+        )
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"switch": True},
+        {
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "newkey",
+            "switch": True,
+        },
+    ],
+)
+async def test_diagnostics_exclude_local_key(hass, options):
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_TYPE: "kogan_switch",
+        },
+        options=options,
+    )
+    device = MagicMock()
+    device.snapshot.return_value = {"1": True, "updated_at": 5}
+    history = DpsHistory()
+    history.record({"1": (None, True)}, when=5)
+    hass.data[DOMAIN] = {"deviceid": {"device": device, "history": history}}
+
+    result = await async_get_config_entry_diagnostics(hass, entry)
+
+    assert result == {
+        "config": {
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "**REDACTED**",
+            CONF_TYPE: "kogan_switch",
+            "switch": True,
+        },
+        "state": {"1": True, "updated_at": 5},
+        "history": [{"time": 5, "dps": "1", "value": True}],
+    }
@@ -0,0 +1,49 @@
+"""Tests for the logging helpers."""
+import logging
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from custom_components.tuya_local.helpers.log import DeviceLogger, LogJson
+
+
+class TestLogJson(TestCase):
+    def test_serializes_when_formatted(self):
+        self.assertEqual(str(LogJson({"1": True})), '{"1": true}')
+
+    def test_callable_is_only_called_when_formatted(self):
+        source = MagicMock(return_value={"1": 2})
+        value = LogJson(source)
+        source.assert_not_called()
+        self.assertEqual(str(value), '{"1": 2}')
+        source.assert_called_once()
+
+
+class TestDeviceLogger(TestCase):
+    def setUp(self):
+        self.logger = MagicMock()
+        self.logger.isEnabledFor.return_value = True
+        self.subject = DeviceLogger(self.logger, interval=60)
+
+    def test_throttled_skips_when_level_disabled(self):
+        self.logger.isEnabledFor.return_value = False
+        self.subject.throttled_debug("key", "message %s", 1)
+        self.logger.log.assert_not_called()
+
+    def test_throttled_rate_limits_per_key(self):
+        with patch("custom_components.tuya_local.helpers.log.monotonic") as mock_time:
+            mock_time.return_value = 100
+            self.subject.throttled_debug("a", "message %s", 1)
+            self.subject.throttled_debug("a", "message %s", 2)
+            self.subject.throttled_debug("b", "other %s", 3)
+            self.logger.log.assert_any_call(logging.DEBUG, "message %s", 1)
+            self.logger.log.assert_any_call(logging.DEBUG, "other %s", 3)
+            self.assertEqual(self.logger.log.call_count, 2)
+
+            mock_time.return_value = 161
+            self.subject.throttled_debug("a", "message %s", 4)
+            self.logger.log.assert_called_with(
+                logging.DEBUG,
+                "message %s (%d similar messages suppressed)",
+                4,
+                1,
+            )
@@ -0,0 +1,80 @@
+"""Tests for the bulk scanner."""
+import json
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from tools import scan
+
+from .const import GPPH_HEATER_PAYLOAD, KOGAN_SOCKET_PAYLOAD
+
+DEVICES_CSV = """device_id,host,local_key,name
+heater,192.168.1.10,key1,Lounge heater
+socket,192.168.1.11,key2,
+offline,192.168.1.12,key3,
+"""
+
+PAYLOADS = {"heater": GPPH_HEATER_PAYLOAD, "socket": KOGAN_SOCKET_PAYLOAD}
+
+
+def fake_device(dev_id, host, local_key):
+    api = MagicMock()
+    api.id = dev_id
+    if dev_id in PAYLOADS:
+        api.status.return_value = {"dps": dict(PAYLOADS[dev_id])}
+    else:
+        api.status.side_effect = OSError("timed out")
+    return api
+
+
+class TestScan(TestCase):
+    def setUp(self):
+        device_patcher = patch("tinytuya.Device", side_effect=fake_device)
+        self.addCleanup(device_patcher.stop)
+        device_patcher.start()
+
+    def test_read_devices_requires_key(self):
+        with self.assertRaises(ValueError):
+            scan.read_devices(["device_id,host", "abc,1.2.3.4"])
+
+    def test_scan_keeps_device_order(self):
+        devices = scan.read_devices(DEVICES_CSV.splitlines())
+        results = scan.scan(devices, workers=2)
+
+        self.assertEqual(
+            [r["device_id"] for r in results], ["heater", "socket", "offline"]
+        )
+        self.assertEqual(results[0]["matches"][0]["type"], "goldair_gpph_heater")
+        self.assertEqual(results[0]["matches"][0]["quality"], 100)
+        self.assertEqual(results[0]["dps"], GPPH_HEATER_PAYLOAD)
+        self.assertEqual(results[2]["error"], "no response")
+        self.assertEqual(results[2]["matches"], [])
+
+    def test_main_writes_entries_and_snapshots(self):
+        with TemporaryDirectory() as tmp:
+            csv_file = join(tmp, "devices.csv")
+            with open(csv_file, "w") as f:
+                f.write(DEVICES_CSV)
+
+            self.assertEqual(scan.main([csv_file, "--output", tmp]), 1)
+
+            with open(join(tmp, "entries.json")) as f:
+                entries = json.load(f)
+            with open(join(tmp, "snapshots.jsonl")) as f:
+                snapshots = [json.loads(line) for line in f]
+
+        self.assertEqual(len(entries), 2)
+        heater = entries[0]
+        self.assertEqual(heater["name"], "Lounge heater")
+        self.assertEqual(heater["device_id"], "heater")
+        self.assertEqual(heater["host"], "192.168.1.10")
+        self.assertEqual(heater["local_key"], "key1")
+        self.assertEqual(heater["type"], "goldair_gpph_heater")
+        self.assertTrue(heater["climate"])
+        self.assertEqual(entries[1]["name"], "Energy Monitoring Smart Plug")
+
+        self.assertEqual(len(snapshots), 3)
+        self.assertNotIn("local_key", snapshots[0])
+        self.assertEqual(snapshots[1]["dps"], KOGAN_SOCKET_PAYLOAD)
+        self.assertEqual(snapshots[2]["error"], "no response")
@@ -1,6 +1,6 @@
 """Tests for the sensor entity."""
 from pytest_homeassistant_custom_component.common import MockConfigEntry
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 from custom_components.tuya_local.const import (
     CONF_DEVICE_ID,
@@ -8,6 +8,8 @@ from custom_components.tuya_local.const import (
     DOMAIN,
 )
 from custom_components.tuya_local.generic.sensor import TuyaLocalSensor
+from custom_components.tuya_local.helpers.config_schema import compile_config
+from custom_components.tuya_local.helpers.device_config import TuyaEntityConfig
 from custom_components.tuya_local.sensor import async_setup_entry
 
 
@@ -76,3 +78,66 @@ async def test_init_entry_fails_if_config_is_missing(hass):
     except ValueError:
         pass
     m_add_entities.assert_not_called()
+
+
+def _sensor(dps):
+    config = compile_config(
+        {
+            "name": "Meter",
+            "primary_entity": {"entity": "sensor", "dps": dps},
+        },
+        "meter.yaml",
+    )
+    device = MagicMock()
+    device.get_property.return_value = 100
+    ecfg = TuyaEntityConfig(MagicMock(), config["primary_entity"], primary=True)
+    return TuyaLocalSensor(device, ecfg), device
+
+
+def _deadband_sensor(deadband):
+    return _sensor(
+        [{"id": 19, "name": "sensor", "type": "integer", "deadband": deadband}]
+    )
+
+
+@patch("custom_components.tuya_local.generic.sensor.monotonic")
+def test_deadband_holds_insignificant_changes(m_time):
+    m_time.return_value = 0
+    subject, device = _deadband_sensor({"absolute": 2, "relative": 0.1})
+    assert subject.native_value == 100
+
+    device.get_property.return_value = 102
+    assert subject.native_value == 100
+    device.get_property.return_value = 109
+    assert subject.native_value == 100
+    device.get_property.return_value = 111
+    assert subject.native_value == 111
+    device.get_property.return_value = None
+    assert subject.native_value is None
+
+
+@patch("custom_components.tuya_local.generic.sensor.monotonic")
+def test_deadband_reports_after_max_silence(m_time):
+    m_time.return_value = 0
+    subject, device = _deadband_sensor({"absolute": 5, "max_silence": 60})
+    assert subject.native_value == 100
+
+    device.get_property.return_value = 101
+    m_time.return_value = 59
+    assert subject.native_value == 100
+    m_time.return_value = 60
+    assert subject.native_value == 101
+
+
+def test_volatile_dps_are_not_attributes():
+    subject, device = _sensor(
+        [
+            {"id": 19, "name": "sensor", "type": "integer"},
+            {"id": 20, "name": "runtime", "type": "integer", "volatile": True},
+            {"id": 21, "name": "mode", "type": "integer"},
+        ]
+    )
+    assert subject.device_state_attributes == {"mode": 100}
+
+    device.get_property.return_value = 5
+    assert subject.device_state_attributes == {"mode": 5}
@@ -0,0 +1,49 @@
+"""Tests for the device snapshot store."""
+from unittest.mock import MagicMock
+
+from custom_components.tuya_local.helpers.snapshot_store import (
+    STORAGE_KEY,
+    async_get_snapshot_store,
+)
+
+
+async def test_device_is_restored_from_snapshot(hass, hass_storage):
+    """Test that a device is seeded from its stored snapshot."""
+    hass_storage[STORAGE_KEY] = {
+        "version": 1,
+        "key": STORAGE_KEY,
+        "data": {"devices": {"dummy": {"dps": {"1": True}, "updated_at": 10}}},
+    }
+    device = MagicMock()
+    device.unique_id = "dummy"
+
+    store = await async_get_snapshot_store(hass)
+    assert store.get("dummy") == {"1": True}
+    store.async_track(device)
+
+    device.restore_state.assert_called_once_with({"1": True})
+    device.add_listener.assert_called_once()
+
+
+async def test_snapshot_is_updated_on_change(hass):
+    """Test that device changes are recorded in the snapshot."""
+    device = MagicMock()
+    device.unique_id = "dummy"
+    device.snapshot.return_value = {"1": False, "updated_at": 20}
+
+    store = await async_get_snapshot_store(hass)
+    store.async_track(device)
+    state_changed = device.add_listener.call_args[0][0]
+    state_changed({"1": (True, False)})
+    await hass.async_block_till_done()
+
+    assert store.get("dummy") == {"1": False}
+
+    device.snapshot.return_value = {}
+    state_changed({"1": (False, None)})
+    await hass.async_block_till_done()
+
+    assert store.get("dummy") == {"1": False}
+
+    store.async_remove("dummy")
+    assert store.get("dummy") is None
@@ -1,9 +1,11 @@
 """Tests for the switch entity."""
+from homeassistant.const import CONF_HOST, STATE_OFF, STATE_ON
 from pytest_homeassistant_custom_component.common import MockConfigEntry
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, Mock, patch
 
 from custom_components.tuya_local.const import (
     CONF_DEVICE_ID,
+    CONF_LOCAL_KEY,
     CONF_SWITCH,
     CONF_TYPE,
     DOMAIN,
@@ -11,6 +13,8 @@ from custom_components.tuya_local.const import (
 from custom_components.tuya_local.generic.switch import TuyaLocalSwitch
 from custom_components.tuya_local.switch import async_setup_entry
 
+from .const import KOGAN_SOCKET_PAYLOAD
+
 
 async def test_init_entry(hass):
     """Test the initialisation."""
@@ -98,3 +102,42 @@ async def test_init_entry_fails_if_config_is_missing(hass):
     except ValueError:
         pass
     m_add_entities.assert_not_called()
+
+
+@patch("tinytuya.Device")
+async def test_turn_on_writes_state_without_waiting_for_a_poll(
+    mock_api, hass, enable_custom_integrations
+):
+    """Test that a command is shown straight away, not at the next poll."""
+    mock_api.return_value.id = "deviceid"
+    mock_api.return_value.status.return_value = {
+        "dps": {**KOGAN_SOCKET_PAYLOAD, "1": False}
+    }
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=7,
+        title="test",
+        data={
+            CONF_DEVICE_ID: "deviceid",
+            CONF_HOST: "hostname",
+            CONF_LOCAL_KEY: "localkey",
+            CONF_TYPE: "smartplugv1",
+        },
+        options={CONF_SWITCH: True},
+    )
+    entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    device = hass.data[DOMAIN]["deviceid"]["device"]
+    await device.async_refresh(wait=True)
+    await hass.async_block_till_done()
+    assert hass.states.get("switch.test").state == STATE_OFF
+
+    with patch("custom_components.tuya_local.device.Timer"):
+        await hass.services.async_call(
+            "switch", "turn_on", {"entity_id": "switch.test"}, blocking=True
+        )
+        await hass.async_block_till_done()
+    assert hass.states.get("switch.test").state == STATE_ON
+
+    await hass.config_entries.async_unload(entry.entry_id)
@@ -0,0 +1,130 @@
+"""
+Command line benchmark for device type detection.
+
+    python -m tools.benchmark corpus.jsonl
+
+The corpus has one JSON object per line, with the dps returned by a device
+and optionally the type it is expected to be detected as:
+
+    {"type": "goldair_gpph_heater", "dps": {"1": true, "2": 25, ...}}
+
+The snapshot archives written by the bulk scanner can be used directly.
+Every sample is ranked against the available configs, and the
+accuracy, ambiguity (more than one perfect match) and throughput reported.
+"""
+import argparse
+import json
+from time import perf_counter
+
+from custom_components.tuya_local.const import CONF_TYPE
+from custom_components.tuya_local.helpers import device_config
+
+
+def load_corpus(f):
+    """Read (expected_type, dps) samples from a JSONL corpus."""
+    samples = []
+    for line in f:
+        line = line.strip()
+        if line:
+            sample = json.loads(line)
+            samples.append((sample.get(CONF_TYPE), sample["dps"]))
+    return samples
+
+
+def rank(dps):
+    """Return (config_type, quality) for the configs matching dps, best first."""
+    return [(m.config.config_type, m.quality) for m in device_config.rank_matches(dps)]
+
+
+def run(samples, repeat=1):
+    """
+    Rank every sample and summarise the results.
+    Returns:
+        A dict with the counts of samples detected correctly, shadowed by
+        an equally good match, ambiguous or not matched at all, the
+        detection throughput, and details of each failure.
+    """
+    report = {
+        "samples": len(samples),
+        "labelled": 0,
+        "correct": 0,
+        "shadowed": 0,
+        "unmatched": 0,
+        "ambiguous": 0,
+        "failures": [],
+        "ambiguities": [],
+    }
+    start = perf_counter()
+    for _ in range(repeat):
+        results = [rank(dps) for _, dps in samples]
+    elapsed = perf_counter() - start
+
+    for (expected, dps), ranked in zip(samples, results):
+        perfect = [t for t, q in ranked if q == 100]
+        if len(perfect) > 1:
+            report["ambiguous"] += 1
+            report["ambiguities"].append(perfect)
+        if not ranked:
+            report["unmatched"] += 1
+        if expected is None:
+            continue
+        report["labelled"] += 1
+        detected = ranked[0][0] if ranked else None
+        if detected == expected:
+            report["correct"] += 1
+        elif ranked and (expected, ranked[0][1]) in ranked:
+            # Tied with the detected type, so only the user can tell them apart
+            report["shadowed"] += 1
+        else:
+            report["failures"].append(
+                {"expected": expected, "detected": detected, "ranked": ranked}
+            )
+
+    labelled = report["labelled"]
+    report["accuracy"] = report["correct"] / labelled if labelled else None
+    report["seconds"] = elapsed
+    report["per_second"] = len(samples) * repeat / elapsed if elapsed else None
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark device detection.")
+    parser.add_argument("corpus", help="JSONL file of dps snapshots")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="number of times to rank the corpus, for stable timings",
+    )
+    parser.add_argument("--config-dir", help="directory of extra device configs to use")
+    parser.add_argument("--json", action="store_true", help="print the full report")
+    args = parser.parse_args(argv)
+    if args.config_dir:
+        device_config.set_user_config_dir(args.config_dir)
+
+    with open(args.corpus) as f:
+        samples = load_corpus(f)
+    report = run(samples, args.repeat)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    for failure in report["failures"]:
+        print(f"{failure['expected']} detected as {failure['detected']}")
+    for types in report["ambiguities"]:
+        print(f"Ambiguous: {', '.join(types)}")
+    if report["accuracy"] is not None:
+        print(
+            f"Accuracy: {report['correct']}/{report['labelled']}"
+            f" ({report['accuracy']:.1%})"
+        )
+    print(f"Shadowed: {report['shadowed']}/{report['labelled']}")
+    print(f"Ambiguous: {report['ambiguous']}/{report['samples']}")
+    print(f"Unmatched: {report['unmatched']}/{report['samples']}")
+    print(f"Throughput: {report['per_second']:.0f} detections/s")
+    return 0 if not report["failures"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
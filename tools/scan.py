@@ -0,0 +1,159 @@
+"""
+Command line tool to scan Tuya devices in bulk.
+
+    python -m tools.scan devices.csv --output scan
+
+The CSV file needs device_id, host and local_key columns, and may have a
+name column.  Devices are polled concurrently, with bounded parallelism,
+and their types detected from the returned dps.  The results are written
+to the output directory as config entries ready to import into Home
+Assistant (entries.json), and an archive of the dps snapshots
+(snapshots.jsonl).
+"""
+import argparse
+import csv
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from os import makedirs
+from os.path import join
+from time import time
+
+from homeassistant.const import CONF_DEVICE_ID, CONF_HOST, CONF_NAME, CONF_TYPE
+
+from custom_components.tuya_local.const import CONF_LOCAL_KEY
+from custom_components.tuya_local.device import TuyaLocalDevice
+from custom_components.tuya_local.helpers import device_config
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+
+
+def read_devices(f):
+    """Read the devices to scan from a CSV file."""
+    devices = []
+    for row in csv.DictReader(f):
+        row = {k.strip(): v.strip() for k, v in row.items() if k and v}
+        for key in (CONF_DEVICE_ID, CONF_HOST, CONF_LOCAL_KEY):
+            if key not in row:
+                raise ValueError(f"Missing {key} in {row}")
+        devices.append(row)
+    return devices
+
+
+def scan_device(row):
+    """
+    Poll a device and detect its type.
+    Returns:
+        A dict with the device's dps and the configs matching them,
+        best match first.
+    """
+    device = TuyaLocalDevice(
+        row.get(CONF_NAME, row[CONF_DEVICE_ID]),
+        row[CONF_DEVICE_ID],
+        row[CONF_HOST],
+        row[CONF_LOCAL_KEY],
+        None,
+    )
+    device.refresh()
+    dps = device.snapshot()
+    dps.pop("updated_at", None)
+    result = {
+        CONF_DEVICE_ID: row[CONF_DEVICE_ID],
+        CONF_HOST: row[CONF_HOST],
+        "time": time(),
+        "dps": dps,
+        "matches": [],
+    }
+    if not dps:
+        result["error"] = "no response"
+        return result
+
+    result["matches"] = [
+        {CONF_TYPE: m.config.config_type, "quality": m.quality}
+        for m in device_config.rank_matches(dps)
+    ]
+    if not result["matches"]:
+        result["error"] = "not supported"
+    return result
+
+
+def scan(devices, workers=DEFAULT_WORKERS):
+    """Scan devices concurrently, returning the results in the same order."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(scan_device, devices))
+
+
+def config_entry(row, result):
+    """
+    Return the config entry data for a scanned device, with the same
+    entities enabled as the config flow does by default, or None if it has
+    no match.  The entries can be imported by listing them under devices
+    in configuration.yaml.
+    """
+    if not result["matches"]:
+        return None
+    cfg = device_config.get_config(result["matches"][0][CONF_TYPE])
+    data = {
+        CONF_NAME: row.get(CONF_NAME, cfg.name),
+        CONF_DEVICE_ID: row[CONF_DEVICE_ID],
+        CONF_HOST: row[CONF_HOST],
+        CONF_LOCAL_KEY: row[CONF_LOCAL_KEY],
+        CONF_TYPE: cfg.config_type,
+        cfg.primary_entity.config_id: True,
+    }
+    for e in cfg.secondary_entities():
+        data[e.config_id] = not e.deprecated
+    return data
+
+
+def write_results(devices, results, output):
+    """Write the config entries and snapshot archive to the output directory."""
+    makedirs(output, exist_ok=True)
+    entries = []
+    with open(join(output, "snapshots.jsonl"), "a") as f:
+        for row, result in zip(devices, results):
+            f.write(json.dumps(result) + "\n")
+            entry = config_entry(row, result)
+            if entry is not None:
+                entries.append(entry)
+
+    with open(join(output, "entries.json"), "w") as f:
+        json.dump(entries, f, indent=2)
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan Tuya devices in bulk.")
+    parser.add_argument("devices", help="CSV file of device_id, host, local_key")
+    parser.add_argument("--output", default=".", help="directory for the results")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="number of devices to scan at once",
+    )
+    parser.add_argument("--config-dir", help="directory of extra device configs to use")
+    args = parser.parse_args(argv)
+    if args.config_dir:
+        device_config.set_user_config_dir(args.config_dir)
+    logging.basicConfig(level=logging.WARNING)
+
+    with open(args.devices, newline="") as f:
+        devices = read_devices(f)
+    results = scan(devices, args.workers)
+    entries = write_results(devices, results, args.output)
+
+    for result in results:
+        if "error" in result:
+            print(f"{result[CONF_DEVICE_ID]}: {result['error']}")
+        else:
+            best = result["matches"][0]
+            print(f"{result[CONF_DEVICE_ID]}: {best[CONF_TYPE]} ({best['quality']}%)")
+    print(f"Scanned {len(results)} devices, {len(entries)} ready to import.")
+    return 0 if len(entries) == len(results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())